@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+#
+# A benchmark of the memory used by each idle connection to an HTTPServer.
+#
+# A child process opens many keep-alive connections to a server running in
+# this process and then leaves them idle.  The growth of the server's
+# Python objects and of its resident set size is reported per connection.
+# With --requests, every connection also sends a request to a handler that
+# never finishes (like a long poll), so each connection holds an
+# HTTPRequest, its headers and a RequestHandler as well.
+#
+# Running:
+# demos/benchmark/connection_memory_benchmark.py
+# demos/benchmark/connection_memory_benchmark.py --num_connections=5000 --requests
+
+import gc
+import os
+import resource
+import signal
+import socket
+import sys
+import time
+
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop, PeriodicCallback
+from tornado.netutil import bind_sockets
+from tornado.options import define, options, parse_command_line
+from tornado.web import Application, RequestHandler, asynchronous
+
+define("num_connections", type=int, default=1000)
+define("requests", type=bool, default=False,
+       help="send a never-finishing request on each connection")
+
+waiting = []
+
+class LongPollHandler(RequestHandler):
+    @asynchronous
+    def get(self):
+        waiting.append(self)
+
+def rss():
+    try:
+        pages = int(open("/proc/self/statm").read().split()[1])
+        return pages * resource.getpagesize()
+    except IOError:
+        # Peak rather than current size, in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def run_clients(port):
+    clients = []
+    for i in xrange(options.num_connections):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.connect(("127.0.0.1", port))
+        if options.requests:
+            sock.sendall("GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        clients.append(sock)
+    while True:
+        time.sleep(60)
+
+def main():
+    parse_command_line()
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = options.num_connections + 100
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+    sockets = bind_sockets(0, "127.0.0.1", family=socket.AF_INET)
+    port = sockets[0].getsockname()[1]
+    io_loop = IOLoop.instance()
+    app = Application([("/", LongPollHandler)],
+                      log_function=lambda handler: None)
+    server = HTTPServer(app, io_loop=io_loop)
+    server.add_sockets(sockets)
+
+    pid = os.fork()
+    if pid == 0:
+        for sock in sockets:
+            sock.close()
+        run_clients(port)
+
+    gc.collect()
+    before_ids = set(id(o) for o in gc.get_objects())
+    before_rss = rss()
+
+    def check():
+        if options.requests:
+            done = len(waiting) >= options.num_connections
+        else:
+            done = server.num_connections() >= options.num_connections
+        if done:
+            io_loop.stop()
+    PeriodicCallback(check, 50, io_loop=io_loop).start()
+    io_loop.start()
+
+    gc.collect()
+    after_rss = rss()
+    new_objects = [o for o in gc.get_objects() if id(o) not in before_ids]
+    object_bytes = sum(sys.getsizeof(o) for o in new_objects)
+    os.kill(pid, signal.SIGTERM)
+    os.waitpid(pid, 0)
+
+    n = float(options.num_connections)
+    print "%d connections%s" % (options.num_connections,
+                                " with requests" if options.requests else "")
+    print "%8.1f objects per connection" % (len(new_objects) / n)
+    print "%8.0f bytes of objects per connection" % (object_bytes / n)
+    print "%8.0f bytes of RSS per connection" % ((after_rss - before_rss) / n)
+
+if __name__ == '__main__':
+    main()
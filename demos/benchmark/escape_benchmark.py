@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+#
+# Microbenchmarks of the functions in tornado.escape.
+#
+# Each function is timed on typical input, in microseconds per call.
+# Functions that have been optimized are compared with their previous
+# implementation, which is copied here.
+#
+# Running:
+# demos/benchmark/escape_benchmark.py
+# demos/benchmark/escape_benchmark.py --num_items=100000 --num_calls=1000
+
+import random
+import timeit
+import xml.sax.saxutils
+
+from tornado.escape import _json_encode, json_decode, json_encode
+from tornado.escape import linkify, recursive_unicode, squeeze
+from tornado.escape import url_escape, url_unescape, xhtml_escape
+from tornado.options import define, options, parse_command_line
+
+define("num_items", type=int, default=10000,
+       help="items in the response encoded by json_encode")
+define("num_calls", type=int, default=100000,
+       help="calls to time for the string functions")
+
+def old_json_encode(value):
+    return _json_encode(recursive_unicode(value)).replace("</", "<\\/")
+
+def old_xhtml_escape(value):
+    return xml.sax.saxutils.escape(value, {'"': "&quot;"})
+
+def make_items():
+    # An API response mixing byte strings (e.g. from a database) and
+    # unicode
+    rand = random.Random(42)
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta"]
+    return {"items": [dict(id=i, name=" ".join(rand.sample(words, 3)),
+                           title=u" ".join(rand.sample(words, 2)),
+                           score=rand.random(), tags=rand.sample(words, 2))
+                      for i in xrange(options.num_items)]}
+
+def time_call(func, arg, number):
+    seconds = min(timeit.repeat(lambda: func(arg), number=number, repeat=3))
+    return seconds / number * 1e6
+
+def report(name, func, arg, old_func=None, number=None):
+    number = number or options.num_calls
+    if old_func is not None:
+        assert func(arg) == old_func(arg), name
+        old = "%10.2fus" % time_call(old_func, arg, number)
+    else:
+        old = "%12s" % "-"
+    print "%-26s %s %10.2fus" % (name, old, time_call(func, arg, number))
+
+def main():
+    parse_command_line()
+    print "%-26s %12s %12s" % ("", "before", "after")
+
+    items = make_items()
+    assert (json_decode(json_encode(items)) ==
+            json_decode(old_json_encode(items)))
+    number = max(1, 100000 // options.num_items)
+    report("json_encode(%d items)" % options.num_items,
+           lambda v: len(json_encode(v)), items,
+           lambda v: len(old_json_encode(v)), number=number)
+
+    for name, value in [
+        ("plain", "Hello, world"),
+        ("unicode", u"Caf\u00e9 cr\u00e8me"),
+        ("markup", 'Say <b>"hi"</b> & wave'),
+        ("long", "lorem ipsum dolor sit amet " * 100 + "<end>"),
+        ]:
+        report("xhtml_escape(%s)" % name, xhtml_escape, value,
+               old_xhtml_escape)
+
+    report("url_escape", url_escape, u"/search?q=caf\u00e9 & cr\u00e8me")
+    report("url_unescape", url_unescape, "%2Fsearch%3Fq%3Dcaf%C3%A9+%26")
+    report("squeeze", squeeze, "  some   text\n\twith \r\n whitespace  ")
+    report("linkify", linkify,
+           "see http://www.tornadoweb.org/ and www.example.com/a?b=c for "
+           "more", number=options.num_calls // 10)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+#
+# A benchmark of gzip compression throughput and ratio by level.
+#
+# A JSON document (like an API response) is compressed the way
+# tornado.web.GZipContentEncoding does it, in --num_chunks flushes, at each
+# of the given levels.  For comparison, the first line shows the previous
+# implementation, a gzip.GzipFile at level 9 writing into a BytesIO.
+#
+# Running:
+# demos/benchmark/gzip_benchmark.py
+# demos/benchmark/gzip_benchmark.py --levels=1,6,9 --num_chunks=10
+
+import gzip
+import random
+import timeit
+import zlib
+
+from cStringIO import StringIO as BytesIO
+from tornado.escape import json_encode, utf8
+from tornado.options import define, options, parse_command_line
+
+define("levels", type=int, multiple=True, default=range(1, 10))
+define("num_items", type=int, default=1000)
+define("num_chunks", type=int, default=1)
+define("num_iters", type=int, default=100)
+
+def make_chunks():
+    rand = random.Random(42)
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta"]
+    items = [dict(id=i, name=" ".join(rand.sample(words, 3)),
+                  score=rand.random(), tags=rand.sample(words, 2))
+             for i in xrange(options.num_items)]
+    data = utf8(json_encode(items))
+    size = len(data) // options.num_chunks + 1
+    return [data[i:i + size] for i in xrange(0, len(data), size)]
+
+def gzip_file(chunks):
+    value = BytesIO()
+    f = gzip.GzipFile(mode="w", fileobj=value)
+    out = []
+    for i, chunk in enumerate(chunks):
+        f.write(chunk)
+        if i == len(chunks) - 1:
+            f.close()
+        else:
+            f.flush()
+        out.append(value.getvalue())
+        value.truncate(0)
+        value.seek(0)
+    return "".join(out)
+
+def compressobj(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    out = []
+    for i, chunk in enumerate(chunks):
+        out.append(compressor.compress(chunk))
+        if i == len(chunks) - 1:
+            out.append(compressor.flush())
+        else:
+            out.append(compressor.flush(zlib.Z_SYNC_FLUSH))
+    return "".join(out)
+
+def report(name, chunks, compress):
+    size = sum(len(c) for c in chunks)
+    compressed = compress()
+    assert zlib.decompress(compressed, 16 + zlib.MAX_WBITS) == "".join(chunks)
+    seconds = min(timeit.repeat(compress, number=options.num_iters,
+                                repeat=3))
+    print "%-14s %10.1f %10.2f" % (
+        name, size * options.num_iters / seconds / 1e6,
+        float(len(compressed)) / size)
+
+def main():
+    parse_command_line()
+    chunks = make_chunks()
+    print "%d bytes in %d chunks" % (sum(len(c) for c in chunks), len(chunks))
+    print "%-14s %10s %10s" % ("", "MB/s", "ratio")
+    report("GzipFile (9)", chunks, lambda: gzip_file(chunks))
+    for level in options.levels:
+        report("level %d" % level, chunks,
+               lambda: compressobj(chunks, level))
+
+if __name__ == '__main__':
+    main()
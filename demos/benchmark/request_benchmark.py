@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+#
+# A benchmark of the per-request overhead of tornado.web.Application.
+#
+# Requests are dispatched in-process to a trivial handler over a stub
+# connection that discards its output, so only the work done by
+# HTTPRequest, Application and RequestHandler is measured.  Besides the
+# time per request, the number of garbage-collected objects that each
+# request keeps alive (request, handler, transforms, ui namespaces, ...)
+# is reported.
+#
+# Running:
+# demos/benchmark/request_benchmark.py
+# demos/benchmark/request_benchmark.py --num_iters=50000
+
+import gc
+import timeit
+
+from tornado.httpserver import HTTPRequest
+from tornado.httputil import HTTPHeaders
+from tornado.options import define, options, parse_command_line
+from tornado.web import Application, RequestHandler
+
+define("num_iters", type=int, default=10000)
+
+class RootHandler(RequestHandler):
+    def get(self):
+        self.write("Hello, world")
+
+class StubConnection(object):
+    xheaders = False
+    stream = None
+
+    def set_close_callback(self, callback):
+        pass
+
+    def write(self, chunk, callback=None):
+        pass
+
+    def finish(self):
+        pass
+
+def main():
+    parse_command_line()
+    app = Application([("/", RootHandler)],
+                      log_function=lambda handler: None)
+    connection = StubConnection()
+    headers = HTTPHeaders({"Host": "localhost",
+                           "Accept-Encoding": "gzip"})
+
+    def request():
+        return app(HTTPRequest("GET", "/?a=1", version="HTTP/1.1",
+                               headers=headers, remote_ip="127.0.0.1",
+                               connection=connection))
+
+    seconds = min(timeit.repeat(request, number=options.num_iters, repeat=3))
+    print "%.2f us per request" % (1e6 * seconds / options.num_iters)
+
+    gc.collect()
+    gc.disable()
+    before = len(gc.get_objects())
+    handlers = [request() for i in xrange(options.num_iters)]
+    after = len(gc.get_objects())
+    gc.enable()
+    print "%.1f objects per request" % (
+        float(after - before - 1) / len(handlers))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+#
+# A benchmark of URL dispatch cost as the number of routes grows.
+#
+# Compares the original linear scan over URLSpecs (one regex match per
+# route until one matches) with the router used by tornado.web.Application.
+# The requested path matches one of the last routes, which is the worst
+# case for the linear scan.
+#
+# Running:
+# demos/benchmark/router_benchmark.py
+# demos/benchmark/router_benchmark.py --num_routes=10,100,300,1000
+
+import timeit
+
+from tornado.options import define, options, parse_command_line
+from tornado.web import RequestHandler, URLSpec, _URLRouter
+
+define("num_routes", type=int, multiple=True, default=[10, 100, 300, 1000])
+define("num_iters", type=int, default=20000)
+
+def make_specs(num_routes):
+    # A mix of the kinds of routes found in real applications: plain
+    # paths, paths with an id and catch-all prefixes.
+    specs = []
+    for i in xrange(num_routes):
+        kind = i % 3
+        if kind == 0:
+            pattern = "/section%d/about" % i
+        elif kind == 1:
+            pattern = "/section%d/item/([0-9]+)" % i
+        else:
+            pattern = "/section%d/files/(.*)" % i
+        specs.append(URLSpec(pattern, RequestHandler))
+    return specs
+
+def linear_find(specs, path):
+    for spec in specs:
+        match = spec.regex.match(path)
+        if match:
+            return spec, match
+    return None, None
+
+def main():
+    parse_command_line()
+    print "%8s %14s %14s" % ("routes", "linear (us)", "router (us)")
+    for num_routes in options.num_routes:
+        specs = make_specs(num_routes)
+        router = _URLRouter(specs)
+        path = "/section%d/item/1234" % (num_routes - 2 - (num_routes % 3))
+        assert linear_find(specs, path)[0] is router.find(path)[0]
+        results = []
+        for find in (lambda: linear_find(specs, path),
+                     lambda: router.find(path)):
+            seconds = min(timeit.repeat(find, number=options.num_iters,
+                                        repeat=3))
+            results.append(1e6 * seconds / options.num_iters)
+        print "%8d %14.2f %14.2f" % (num_routes, results[0], results[1])
+
+if __name__ == '__main__':
+    main()
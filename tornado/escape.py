@@ -23,7 +23,6 @@ have crept in over time.
 import htmlentitydefs
 import re
 import sys
-import xml.sax.saxutils
 import urllib
 
 # Python3 compatibility:  On python2.5, introduce the bytes alias from 2.6
@@ -42,6 +41,27 @@ try:
     assert hasattr(json, "loads") and hasattr(json, "dumps")
     _json_decode = json.loads
     _json_encode = json.dumps
+    if sys.version_info[0] >= 3:
+        # json only accepts byte strings on python 2
+        def _json_default(obj):
+            if isinstance(obj, bytes):
+                return to_unicode(obj)
+            raise TypeError(repr(obj) + " is not JSON serializable")
+        def _json_encode(value):
+            try:
+                return json.dumps(value, default=_json_default)
+            except TypeError:
+                # Byte strings as dictionary keys don't go through
+                # the default function
+                return json.dumps(recursive_unicode(value))
+    elif getattr(json.encoder, "c_make_encoder", None) is None:
+        # Python 2.6's json has no C encoder, but simplejson may have one
+        try:
+            import simplejson
+            if getattr(simplejson.encoder, "c_make_encoder", None):
+                _json_encode = simplejson.dumps
+        except ImportError:
+            pass
 except Exception:
     try:
         import simplejson
@@ -62,8 +82,16 @@ except Exception:
 
 
 def xhtml_escape(value):
-    """Escapes a string so it is valid within XML or XHTML."""
-    return xml.sax.saxutils.escape(to_basestring(value), {'"': "&quot;"})
+    """Escapes a string so it is valid within XML or XHTML.
+
+    ``&``, ``<``, ``>`` and ``"`` are replaced with entities.
+    """
+    # str.replace is a C loop that returns the string itself when there
+    # is nothing to replace, so strings without special characters are
+    # not copied.  This is faster than a single regular expression pass,
+    # which calls back into python for every match.
+    return to_basestring(value).replace("&", "&amp;").replace(
+        "<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
 
 
 def xhtml_unescape(value):
@@ -72,14 +100,20 @@ def xhtml_unescape(value):
 
 
 def json_encode(value):
-    """JSON-encodes the given Python object."""
+    """JSON-encodes the given Python object.
+
+    Byte strings are accepted anywhere in the object, as long as they are
+    UTF-8.  They are decoded by the JSON encoder as it goes, without
+    copying the object first.
+    """
     # JSON permits but does not require forward slashes to be escaped.
     # This is useful when json data is emitted in a <script> tag
     # in HTML, as it prevents </script> tags from prematurely terminating
     # the javscript.  Some json libraries do this escaping by default,
     # although python's standard library does not, so we do it here.
     # http://stackoverflow.com/questions/1580647/json-why-are-forward-slashes-escaped
-    return _json_encode(recursive_unicode(value)).replace("</", "<\\/")
+    # (replace() returns the string itself if there is nothing to replace)
+    return _json_encode(value).replace("</", "<\\/")
 
 
 def json_decode(value):
@@ -0,0 +1,230 @@
+"""Server-side implementation of Server-Sent Events.
+
+`Server-Sent Events <http://dev.w3.org/html5/eventsource/>`_ let the
+server push a stream of events to the browser over a single long-lived
+HTTP response, which the browser reads with the ``EventSource`` object.
+Unlike long polling, a client does not need a new request for each batch
+of messages, and it reconnects automatically, asking for the events it
+missed with the ``Last-Event-ID`` header.
+
+An `EventSource` is a channel of events.  Each `EventSourceHandler`
+connected to it receives everything sent on the channel::
+
+    chat_events = tornado.eventsource.EventSource()
+
+    class MessageNewHandler(tornado.web.RequestHandler):
+        def post(self):
+            chat_events.send(dict(body=self.get_argument("body")),
+                             event="message")
+
+    application = tornado.web.Application([
+        (r"/a/message/new", MessageNewHandler),
+        (r"/a/message/events", tornado.eventsource.EventSourceHandler,
+         dict(source=chat_events)),
+    ])
+
+In the browser::
+
+    var source = new EventSource("/a/message/events");
+    source.addEventListener("message", function(evt) {
+        showMessage(JSON.parse(evt.data));
+    }, false);
+"""
+
+import collections
+import logging
+import re
+
+from tornado import escape
+from tornado import ioloop
+from tornado.util import b
+from tornado.web import RequestHandler, asynchronous
+
+
+class EventSource(object):
+    """A channel of events sent to all of its subscribed handlers.
+
+    Each event is formatted once and the same bytes are written to every
+    subscriber.  The last ``history_size`` events are kept, so clients
+    that reconnect with a ``Last-Event-ID`` header are sent the events
+    they missed.  Every ``keepalive_interval`` seconds a comment is sent
+    to all subscribers, so that proxies do not close idle connections;
+    one timer is shared by all subscribers, and it only runs while there
+    are any.
+
+    A subscriber whose connection would have more than
+    ``max_buffer_size`` bytes that could not be sent yet is disconnected, so one slow client
+    cannot make the server buffer an unbounded amount of data.  It will
+    catch up from the history when it reconnects.
+    """
+    def __init__(self, history_size=100, keepalive_interval=15,
+                 max_buffer_size=1024 * 1024, io_loop=None):
+        self.history_size = history_size
+        self.keepalive_interval = keepalive_interval
+        self.max_buffer_size = max_buffer_size
+        self.io_loop = io_loop or ioloop.IOLoop.instance()
+        self._subscribers = set()
+        # (id, formatted event) pairs, oldest first
+        self._history = collections.deque()
+        self._last_id = 0
+        self._keepalive = None
+
+    def send(self, data, event=None):
+        """Sends an event to all subscribers and returns its id.
+
+        ``data`` may be a string, or a dictionary that is sent as JSON.
+        ``event`` is the event type; clients receive events without a
+        type as ``message`` events.
+        """
+        self._last_id += 1
+        message = _format_event(self._last_id, data, event)
+        self._history.append((self._last_id, message))
+        if len(self._history) > self.history_size:
+            self._history.popleft()
+        self._write_all(message)
+        return self._last_id
+
+    def subscribe(self, handler):
+        """Adds a handler to the channel.
+
+        Returns the formatted events it missed, according to its
+        ``Last-Event-ID`` header.
+        """
+        self._subscribers.add(handler)
+        if self._keepalive is None and self.keepalive_interval:
+            self._keepalive = ioloop.PeriodicCallback(
+                self._send_keepalive, self.keepalive_interval * 1000,
+                io_loop=self.io_loop)
+            self._keepalive.start()
+        last_id = handler.request.headers.get("Last-Event-ID")
+        try:
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            return b("")
+        return b("").join([message for (id, message) in self._history
+                           if id > last_id])
+
+    def unsubscribe(self, handler):
+        """Removes a handler from the channel."""
+        self._subscribers.discard(handler)
+        if not self._subscribers and self._keepalive is not None:
+            self._keepalive.stop()
+            self._keepalive = None
+
+    def subscriber_count(self):
+        """Returns the number of handlers subscribed to the channel."""
+        return len(self._subscribers)
+
+    def _send_keepalive(self):
+        self._write_all(_KEEPALIVE)
+
+    def _write_all(self, message):
+        # Copy the set, since slow subscribers are removed as we go
+        for handler in list(self._subscribers):
+            handler.write_event(message)
+
+
+class EventSourceHandler(RequestHandler):
+    """A handler that sends the events of an `EventSource` to its client.
+
+    The `EventSource` is given as the ``source`` argument in the
+    handler's URL spec.  Subclasses may override `get` to choose the
+    source for each request (for instance after checking
+    `RequestHandler.current_user`), and call `subscribe` with it.
+    Override `on_close` to be notified when the client goes away.
+
+    The events are written directly to the connection instead of through
+    `RequestHandler.write`, so output transforms such as gzip and chunked
+    encoding are not applied.  The response ends when either side closes
+    the connection; the request is logged then.  Only GET is supported,
+    as an event stream has no end to describe in a response to HEAD.
+    """
+    SUPPORTED_METHODS = ("GET",)
+
+    def initialize(self, source=None):
+        self.source = source
+        self._subscribed = None
+
+    @asynchronous
+    def get(self, *args, **kwargs):
+        self.subscribe(self.source)
+
+    def subscribe(self, source):
+        """Starts sending the events of ``source`` to this client."""
+        assert self._subscribed is None, "Already subscribed"
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+        self._subscribed = source
+        missed = source.subscribe(self)
+        self._headers_written = True
+        self.write_event(self._generate_headers() + missed)
+
+    def write_event(self, message):
+        """Writes a formatted event to the connection.
+
+        Called by the `EventSource`; ``message`` is shared by all of its
+        subscribers.  Disconnects the client if it is too far behind.
+        """
+        stream = self.request.connection.stream
+        if stream.closed():
+            return
+        if (stream.write_buffer_size() + len(message) >
+            self._subscribed.max_buffer_size):
+            logging.warning("Disconnecting slow event stream client %s",
+                            self.request.remote_ip)
+            self.close()
+            return
+        stream.write(message)
+
+    def close(self):
+        """Ends the event stream and closes the connection."""
+        self._unsubscribe()
+        self.request.connection.stream.close()
+
+    def on_connection_close(self):
+        self._unsubscribe()
+
+    def _unsubscribe(self):
+        if self._subscribed is not None:
+            self._subscribed.unsubscribe(self)
+            self._subscribed = None
+            self.on_close()
+            # The response ends with the connection rather than with
+            # finish(), so log the request here
+            self._end_phases()
+            self._log()
+            self._finished = True
+
+    def write_error(self, status_code, **kwargs):
+        if status_code == 405:
+            self.set_header("Allow", ", ".join(self.SUPPORTED_METHODS))
+        super(EventSourceHandler, self).write_error(status_code, **kwargs)
+
+    def on_close(self):
+        """Invoked when the client's connection has been closed."""
+        pass
+
+
+_KEEPALIVE = b(":\n\n")
+_LINE_BREAK = re.compile(u"\r\n|\r|\n")
+
+
+def _format_event(id, data, event=None):
+    """Formats an event in the ``text/event-stream`` format.
+
+    >>> _format_event(1, "line one\\nline two", "note")
+    'id: 1\\nevent: note\\ndata: line one\\ndata: line two\\n\\n'
+    """
+    if isinstance(data, dict):
+        data = escape.json_encode(data)
+    lines = ["id: %d" % id]
+    if event is not None:
+        lines.append("event: " + event)
+    for line in _LINE_BREAK.split(escape.to_unicode(data)):
+        lines.append(u"data: " + line)
+    return escape.utf8(u"\n".join(lines) + u"\n\n")
+
+
+def doctests():
+    import doctest
+    return doctest.DocTestSuite()
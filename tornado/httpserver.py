@@ -26,10 +26,12 @@ This module also defines the `HTTPRequest` class which is exposed via
 
 import errno
 import logging
+import math
 import os
 import socket
 import time
 import urlparse
+import weakref
 
 from tornado.escape import utf8, native_str, parse_qs_bytes
 from tornado import httputil
@@ -71,17 +73,49 @@ class HTTPServer(object):
 
     HTTPServer is a very basic connection handler. Beyond parsing the
     HTTP request body and headers, the only HTTP semantics implemented
-    in HTTPServer is HTTP/1.1 keep-alive connections. We do not, however,
-    implement chunked encoding, so the request callback must provide a
-    Content-Length header or implement chunked encoding for HTTP/1.1
-    requests for the server to run correctly for HTTP/1.1 clients. If
-    the request handler is unable to do this, you can provide the
-    no_keep_alive argument to the HTTPServer constructor, which will
-    ensure the connection is closed on every request no matter what HTTP
-    version the client is using.
-
-    If connection_timeout is set, HTTP keep-alive connections will be closed
-    after that many seconds of inactivity.
+    in HTTPServer is HTTP/1.1 keep-alive connections and the decoding of
+    chunked request bodies. We do not, however, implement chunked encoding
+    for responses, so the request callback must provide a Content-Length
+    header or implement chunked encoding for HTTP/1.1 requests for the
+    server to run correctly for HTTP/1.1 clients. If the request handler
+    is unable to do this, you can provide the no_keep_alive argument to
+    the HTTPServer constructor, which will ensure the connection is closed
+    on every request no matter what HTTP version the client is using.
+
+    Slow or idle clients are disconnected by three deadlines (in seconds):
+    ``header_timeout`` limits the time from accepting a connection until
+    the headers of its first request have been received, ``body_timeout``
+    the time taken to receive a request body once its headers have
+    arrived, and ``idle_timeout`` the time a keep-alive connection may
+    wait for the headers of its next request.  No deadline applies while
+    a request is being processed by the application.  Rather than
+    scheduling a timeout per connection, connections are grouped by
+    deadline and closed by a single periodic sweep, so a connection may
+    outlive its deadline by up to a second.  The number of connections
+    closed by each rule is available from `reaped_connections`.
+    ``connection_timeout`` is accepted for backwards compatibility and
+    is used as the default for each of the three deadlines.
+
+    Request bodies may be sent either with a Content-Length header or
+    with ``Transfer-Encoding: chunked``.  ``max_body_size`` limits the
+    total size of a request body and ``max_chunk_size`` the size of a
+    single chunk of a chunked body (both default to the ``IOStream``
+    maximum buffer size).  Requests exceeding either limit are rejected
+    and their connection is closed.
+
+    By default the request callback is run once the entire body has been
+    read into `HTTPRequest.body`.  If ``stream_request_body`` is True, the
+    callback is instead run as soon as the headers have been read, and
+    it must call `HTTPConnection.read_body` to consume the body (which
+    may be delivered incrementally through a streaming callback) before
+    finishing the request.
+
+    If ``max_connections`` is set, the server stops accepting new
+    connections while that many connections are open, leaving further
+    clients waiting in the listen backlog until an open connection is
+    closed.  At most ``accept_batch_size`` connections are accepted on
+    each ``IOLoop`` iteration (None means no limit).  The number of open
+    connections is available from `num_connections`.
 
     If xheaders is True, we support the X-Real-Ip and X-Scheme headers,
     which override the remote IP and HTTP scheme for all requests. These
@@ -136,14 +170,36 @@ class HTTPServer(object):
        `tornado.netutil.bind_sockets`.
     """
     def __init__(self, request_callback, no_keep_alive=False, io_loop=None,
-                 xheaders=False, ssl_options=None, connection_timeout=-1):
+                 xheaders=False, ssl_options=None, connection_timeout=-1,
+                 stream_request_body=False, max_body_size=None,
+                 max_chunk_size=None, max_connections=None,
+                 accept_batch_size=128, header_timeout=None,
+                 body_timeout=None, idle_timeout=None):
         self.request_callback = request_callback
         self.no_keep_alive = no_keep_alive
         self.connection_timeout = connection_timeout
+        if connection_timeout != -1:
+            if header_timeout is None: header_timeout = connection_timeout
+            if body_timeout is None: body_timeout = connection_timeout
+            if idle_timeout is None: idle_timeout = connection_timeout
+        self.header_timeout = header_timeout
+        self.body_timeout = body_timeout
+        self.idle_timeout = idle_timeout
+        self._reaper = None
+        self.stream_request_body = stream_request_body
+        self.max_body_size = max_body_size
+        self.max_chunk_size = max_chunk_size
+        self.max_connections = max_connections
+        self.accept_batch_size = accept_batch_size
         self.io_loop = io_loop
         self.xheaders = xheaders
         self.ssl_options = ssl_options
         self._sockets = {}  # fd -> socket object
+        self._accept_handlers = {}  # fd -> function to remove accept handler
+        self._accepting_paused = False
+        self._connections = set()
+        self._drain_callback = None
+        self._drain_timeout = None
         self._pending_sockets = []
         self._started = False
 
@@ -169,10 +225,15 @@ class HTTPServer(object):
         """
         if self.io_loop is None:
             self.io_loop = ioloop.IOLoop.instance()
+        if self._reaper is None:
+            self._reaper = _ConnectionReaper(
+                self.io_loop, header_timeout=self.header_timeout,
+                body_timeout=self.body_timeout,
+                idle_timeout=self.idle_timeout)
         for sock in sockets:
             self._sockets[sock.fileno()] = sock
-            netutil.add_accept_handler(sock, self._handle_connection,
-                                       io_loop=self.io_loop)
+            if not self._accepting_paused:
+                self._add_accept_handler(sock)
 
     def add_socket(self, socket):
         """Singular version of `add_sockets`.  Takes a single socket object."""
@@ -232,15 +293,100 @@ class HTTPServer(object):
         self._pending_sockets = []
         self.add_sockets(sockets)
 
-    def stop(self):
+    def stop(self, callback=None, timeout=None):
         """Stops listening for new connections.
 
         Requests currently in progress may still continue after the
         server is stopped.
+
+        If a ``callback`` is given, the server also drains its existing
+        connections: idle keep-alive connections are closed immediately,
+        connections with a request in progress are closed once that
+        request has finished (`tornado.web.RequestHandler` marks those
+        responses with ``Connection: close``), and ``callback`` is run
+        when no connections remain.  If ``timeout`` (in seconds) is given and connections are
+        still open after that long, they are closed and ``callback`` is
+        run anyway.
         """
         for fd, sock in self._sockets.iteritems():
-            self.io_loop.remove_handler(fd)
+            remove_handler = self._accept_handlers.pop(fd, None)
+            if remove_handler is not None:
+                remove_handler()
             sock.close()
+        self._sockets = {}
+        self._accepting_paused = False
+        if callback is None:
+            return
+        self._drain_callback = stack_context.wrap(callback)
+        if timeout is not None:
+            self._drain_timeout = self.io_loop.add_timeout(
+                time.time() + timeout, self._on_drain_timeout)
+        for connection in list(self._connections):
+            connection._start_drain()
+        # Close callbacks run asynchronously, so check from a callback too
+        self.io_loop.add_callback(self._maybe_finish_drain)
+
+    def _maybe_finish_drain(self):
+        if self._drain_callback is not None and not self._connections:
+            if self._drain_timeout is not None:
+                self.io_loop.remove_timeout(self._drain_timeout)
+                self._drain_timeout = None
+            callback = self._drain_callback
+            self._drain_callback = None
+            callback()
+
+    def _on_drain_timeout(self):
+        self._drain_timeout = None
+        if self._drain_callback is None:
+            return
+        logging.warning("Closing %d connections still open after drain "
+                        "timeout", len(self._connections))
+        for connection in list(self._connections):
+            connection.stream.close()
+        callback = self._drain_callback
+        self._drain_callback = None
+        callback()
+
+    def num_connections(self):
+        """Returns the number of connections currently open on this server."""
+        return len(self._connections)
+
+    def reaped_connections(self):
+        """Returns the number of connections closed by each timeout.
+
+        The result is a dictionary with the keys ``"header"``, ``"body"``
+        and ``"idle"``.
+        """
+        if self._reaper is None:
+            return dict(header=0, body=0, idle=0)
+        return dict(self._reaper.reaped)
+
+    def _add_accept_handler(self, sock):
+        self._accept_handlers[sock.fileno()] = netutil.add_accept_handler(
+            sock, self._handle_connection, io_loop=self.io_loop,
+            accept_batch_size=self.accept_batch_size)
+
+    def _pause_accepting(self):
+        logging.warning("Reached max_connections (%d), pausing accept",
+                        self.max_connections)
+        self._accepting_paused = True
+        for remove_handler in self._accept_handlers.itervalues():
+            remove_handler()
+        self._accept_handlers = {}
+
+    def _resume_accepting(self):
+        logging.info("Below max_connections (%d), resuming accept",
+                     self.max_connections)
+        self._accepting_paused = False
+        for sock in self._sockets.itervalues():
+            self._add_accept_handler(sock)
+
+    def _connection_closed(self, connection):
+        self._connections.discard(connection)
+        if (self._accepting_paused and
+            len(self._connections) < self.max_connections):
+            self._resume_accepting()
+        self._maybe_finish_drain()
 
     def _handle_connection(self, connection, address):
         if self.ssl_options is not None:
@@ -268,12 +414,98 @@ class HTTPServer(object):
             if connection.family not in (socket.AF_INET, socket.AF_INET6):
                 # Unix (or other) socket; fake the remote address
                 address = ('0.0.0.0', 0)
-            HTTPConnection(stream, address, self.request_callback,
-                           self.no_keep_alive, self.xheaders,
-                           self.connection_timeout)
+            connection = HTTPConnection(
+                stream, address, self.request_callback,
+                self.no_keep_alive, self.xheaders, self.connection_timeout,
+                self.stream_request_body, self.max_body_size,
+                self.max_chunk_size, server=self, reaper=self._reaper)
+            self._connections.add(connection)
+            if (self.max_connections is not None and
+                not self._accepting_paused and
+                len(self._connections) >= self.max_connections):
+                self._pause_accepting()
         except Exception:
             logging.error("Error in connection callback", exc_info=True)
 
+class _ConnectionReaper(object):
+    """Closes connections that miss their header, body or idle deadline.
+
+    Each connection has at most one deadline at a time.  Connections are
+    kept in buckets keyed by their deadline rounded up to the sweep
+    interval, so setting or clearing a deadline is a set operation and a
+    single `PeriodicCallback` closes every connection in the expired
+    buckets.  The callback only runs while some connection has a deadline.
+    """
+    def __init__(self, io_loop, header_timeout=None, body_timeout=None,
+                 idle_timeout=None):
+        # Only a weak reference, so that the reapers in _shared_reapers
+        # don't keep their IOLoops alive (the PeriodicCallback does while
+        # it runs, but then there are connections using the IOLoop anyway)
+        self._io_loop = weakref.ref(io_loop)
+        self.timeouts = dict(header=header_timeout, body=body_timeout,
+                             idle=idle_timeout)
+        self.reaped = dict(header=0, body=0, idle=0)
+        configured = [t for t in self.timeouts.itervalues() if t is not None]
+        self.interval = min([1.0] + configured)
+        self._buckets = {}  # bucket -> set of connections
+        self._deadlines = {}  # connection -> (bucket, rule)
+        self._periodic = None
+
+    def set_deadline(self, connection, rule):
+        """Replaces the deadline of ``connection`` with the given rule's."""
+        self.clear_deadline(connection)
+        timeout = self.timeouts[rule]
+        if timeout is None:
+            return
+        bucket = int(math.ceil((time.time() + timeout) / self.interval))
+        self._buckets.setdefault(bucket, set()).add(connection)
+        self._deadlines[connection] = (bucket, rule)
+        if self._periodic is None:
+            self._periodic = ioloop.PeriodicCallback(
+                self._sweep, self.interval * 1000, io_loop=self._io_loop())
+            self._periodic.start()
+
+    def clear_deadline(self, connection):
+        """Removes the deadline (if any) of ``connection``."""
+        entry = self._deadlines.pop(connection, None)
+        if entry is not None:
+            connections = self._buckets[entry[0]]
+            connections.discard(connection)
+            if not connections:
+                del self._buckets[entry[0]]
+
+    def _sweep(self):
+        now = int(time.time() / self.interval)
+        expired = [b for b in self._buckets if b <= now]
+        for bucket in expired:
+            for connection in self._buckets.pop(bucket):
+                bucket, rule = self._deadlines.pop(connection)
+                self.reaped[rule] += 1
+                logging.info("Closing connection from %s: %s timeout",
+                             connection.address[0], rule)
+                connection.stream.close()
+        if not self._buckets:
+            self._periodic.stop()
+            self._periodic = None
+
+
+# IOLoop -> {connection_timeout: _ConnectionReaper}, for connections that
+# are not created by an HTTPServer
+_shared_reapers = weakref.WeakKeyDictionary()
+
+def _shared_reaper(io_loop, timeout):
+    """Returns the reaper shared by connections on ``io_loop`` that were
+    created without one, so they don't get a timer each.
+    """
+    reapers = _shared_reapers.setdefault(io_loop, {})
+    reaper = reapers.get(timeout)
+    if reaper is None:
+        reaper = reapers[timeout] = _ConnectionReaper(
+            io_loop, header_timeout=timeout, body_timeout=timeout,
+            idle_timeout=timeout)
+    return reaper
+
+
 class _BadRequestException(Exception):
     """Exception class for malformed HTTP requests."""
     pass
@@ -283,48 +515,99 @@ class HTTPConnection(object):
 
     We parse HTTP headers and bodies, and execute the request callback
     until the HTTP conection is closed.
+
+    Like `HTTPRequest`, this class uses ``__slots__``; attributes not
+    listed there go into a ``__dict__`` that is only created when needed,
+    and connections can be weakly referenced.
     """
+    __slots__ = ("stream", "address", "request_callback", "no_keep_alive",
+                 "xheaders", "connection_timeout", "stream_request_body",
+                 "max_body_size", "max_chunk_size", "_server", "_reaper",
+                 "_request", "_request_finished", "_header_callback",
+                 "_close_callback", "_body_length", "_body_chunked",
+                 "_body_chunks", "_body_size", "_body_callback",
+                 "_body_streaming_callback", "_write_callback", "__dict__",
+                 "__weakref__")
     def __init__(self, stream, address, request_callback, no_keep_alive=False,
-                 xheaders=False, connection_timeout=-1):
+                 xheaders=False, connection_timeout=-1,
+                 stream_request_body=False, max_body_size=None,
+                 max_chunk_size=None, server=None, reaper=None):
         self.stream = stream
         self.address = address
         self.request_callback = request_callback
         self.no_keep_alive = no_keep_alive
         self.connection_timeout = connection_timeout
         self.xheaders = xheaders
+        self.stream_request_body = stream_request_body
+        self.max_body_size = max_body_size or stream.max_buffer_size
+        self.max_chunk_size = max_chunk_size or self.max_body_size
         self._request = None
         self._request_finished = False
+        self._body_length = None
+        self._body_chunked = False
+        self._body_chunks = None
+        self._body_size = 0
+        self._body_callback = None
+        self._body_streaming_callback = None
+        self._server = server
+        if reaper is None:
+            if connection_timeout == -1:
+                connection_timeout = None
+            reaper = _shared_reaper(stream.io_loop, connection_timeout)
+        self._reaper = reaper
+        self._close_callback = None
+        self._write_callback = None
+        # Not set_close_callback, which applications may replace
+        self.stream._close_hook = stack_context.wrap(self._on_connection_close)
         # Save stack context here, outside of any request.  This keeps
         # contexts from one request from leaking into the next.
         self._header_callback = stack_context.wrap(self._on_headers)
+        self._reaper.set_deadline(self, "header")
         self.stream.read_until(b("\r\n\r\n"), self._header_callback)
-        self._timeout_handle = None
-        self.reset_connection_timeout()
 
-    def reset_connection_timeout(self):
-        if self.connection_timeout == -1:
-            return
-        self.remove_connection_timeout()
-        self._timeout_handle = self.stream.io_loop.add_timeout(
-            time.time() + self.connection_timeout, self._handle_timeout)
+    def _start_drain(self):
+        # Finish the current request (if any) and then disconnect.
+        self.no_keep_alive = True
+        if self._request is None:
+            self.stream.close()
 
     def remove_connection_timeout(self):
-        if self._timeout_handle:
-            self.stream.io_loop.remove_timeout(self._timeout_handle)
+        """Removes the current deadline (if any) from this connection.
 
-    def _handle_timeout(self):
-        if self.stream.closed():
-            return
-        
-        if self.stream.writing():
-            self.reset_connection_timeout()
-        else:
-            self.stream.close()
+        Used when the connection is taken over by another protocol, such
+        as a WebSocket.
+        """
+        self._reaper.clear_deadline(self)
+
+    def set_close_callback(self, callback):
+        """Sets a callback that will be run when the connection is closed.
 
-    def write(self, chunk):
-        """Writes a chunk of output to the stream."""
+        Only one callback may be set at a time; pass None to clear it.
+        The stream's own close callback (``stream.set_close_callback``)
+        is independent of this one, and is also run.
+        """
+        self._close_callback = stack_context.wrap(callback)
+
+    def _on_connection_close(self):
+        self._reaper.clear_deadline(self)
+        if self._server is not None:
+            self._server._connection_closed(self)
+        callback = self._close_callback
+        self._close_callback = None
+        if callback is not None:
+            callback()
+
+    def write(self, chunk, callback=None):
+        """Writes a chunk of output to the stream.
+
+        If a callback is given, it is run once all data written so far
+        has been handed to the socket.  As with `IOStream.write`, a
+        callback that has not run yet is replaced by a new one.
+        """
         assert self._request, "Request closed"
         if not self.stream.closed():
+            if callback is not None:
+                self._write_callback = stack_context.wrap(callback)
             self.stream.write(chunk, self._on_write_complete)
 
     def finish(self):
@@ -335,7 +618,12 @@ class HTTPConnection(object):
             self._finish_request()
 
     def _on_write_complete(self):
-        if self._request_finished:
+        if self._write_callback is not None:
+            callback = self._write_callback
+            self._write_callback = None
+            callback()
+        # The callback may have written more data
+        if self._request_finished and not self.stream.writing():
             self._finish_request()
 
     def _finish_request(self):
@@ -355,13 +643,12 @@ class HTTPConnection(object):
         if disconnect:
             self.stream.close()
             return
-        else:
-            self.reset_connection_timeout()
+        self._reaper.set_deadline(self, "idle")
         self.stream.read_until(b("\r\n\r\n"), self._header_callback)
 
     def _on_headers(self, data):
         try:
-            self.reset_connection_timeout()
+            self._reaper.clear_deadline(self)
             data = native_str(data.decode('latin1'))
             eol = data.find("\r\n")
             start_line = data[:eol]
@@ -376,25 +663,122 @@ class HTTPConnection(object):
                 connection=self, method=method, uri=uri, version=version,
                 headers=headers, remote_ip=self.address[0])
 
+            self._body_length = None
+            self._body_chunked = False
+            transfer_encoding = headers.get("Transfer-Encoding")
             content_length = headers.get("Content-Length")
-            if content_length:
+            if transfer_encoding:
+                # Transfer-Encoding overrides any Content-Length header
+                # (http://tools.ietf.org/html/rfc2616#section-4.4)
+                if transfer_encoding.lower() != "chunked":
+                    raise _BadRequestException(
+                        "Unsupported Transfer-Encoding %s" % transfer_encoding)
+                self._body_chunked = True
+            elif content_length:
                 content_length = int(content_length)
-                if content_length > self.stream.max_buffer_size:
+                if content_length > self.max_body_size:
                     raise _BadRequestException("Content-Length too long")
+                self._body_length = content_length
+            if self._body_chunked or self._body_length:
                 if headers.get("Expect") == "100-continue":
                     self.stream.write("HTTP/1.1 100 (Continue)\r\n\r\n")
-                self.stream.read_bytes(content_length, self._on_request_body)
-                return
+                if not self.stream_request_body:
+                    self.read_body(self._on_request_body)
+                    return
 
             self.request_callback(self._request)
         except _BadRequestException, e:
-            logging.info("Malformed HTTP request from %s: %s",
-                         self.address[0], e)
-            self.stream.close()
+            self._on_bad_request(e)
             return
 
+    def _on_bad_request(self, e):
+        logging.info("Malformed HTTP request from %s: %s",
+                     self.address[0], e)
+        self.stream.close()
+
+    def read_body(self, callback, streaming_callback=None):
+        """Reads the body of the current request.
+
+        ``callback`` is run with the entire body once it has been read
+        (for requests without a body it is run with an empty string).
+        If a ``streaming_callback`` is given, it will be called with
+        chunks of data as they become available, and the argument to the
+        final ``callback`` will be empty.  Chunked request bodies are
+        decoded before being passed to either callback.
+
+        This is done automatically unless the server was created with
+        ``stream_request_body=True``, in which case the request callback
+        must call this method exactly once for each request.
+        """
+        assert self._request, "Request closed"
+        if self._body_chunked or self._body_length:
+            self._reaper.set_deadline(self, "body")
+            original_callback = callback
+            def callback(data):
+                self._reaper.clear_deadline(self)
+                original_callback(data)
+        if self._body_chunked:
+            self._body_chunks = []
+            self._body_size = 0
+            self._body_callback = stack_context.wrap(callback)
+            self._body_streaming_callback = stack_context.wrap(
+                streaming_callback)
+            self.stream.read_until(b("\r\n"), self._on_chunk_length)
+        elif self._body_length:
+            self.stream.read_bytes(self._body_length, callback,
+                                   streaming_callback=streaming_callback)
+        else:
+            self.stream.io_loop.add_callback(lambda: callback(b("")))
+
+    def _on_chunk_length(self, data):
+        try:
+            # Chunk extensions (after a semicolon) are ignored
+            # http://tools.ietf.org/html/rfc2616#section-3.6.1
+            try:
+                length = int(data.split(b(";"), 1)[0].strip(), 16)
+            except ValueError:
+                raise _BadRequestException("Malformed chunk length")
+            if length < 0:
+                raise _BadRequestException("Malformed chunk length")
+            if length > self.max_chunk_size:
+                raise _BadRequestException("Chunk too large")
+            self._body_size += length
+            if self._body_size > self.max_body_size:
+                raise _BadRequestException("Chunked request body too large")
+        except _BadRequestException, e:
+            self._on_bad_request(e)
+            return
+        if length == 0:
+            self.stream.read_until(b("\r\n"), self._on_chunk_trailer)
+        else:
+            # chunk ends with \r\n
+            self.stream.read_bytes(length + 2, self._on_chunk_data)
+
+    def _on_chunk_data(self, data):
+        if data[-2:] != b("\r\n"):
+            self._on_bad_request(_BadRequestException("Malformed chunk"))
+            return
+        chunk = data[:-2]
+        if self._body_streaming_callback is not None:
+            self._body_streaming_callback(chunk)
+        else:
+            self._body_chunks.append(chunk)
+        self.stream.read_until(b("\r\n"), self._on_chunk_length)
+
+    def _on_chunk_trailer(self, data):
+        if data != b("\r\n"):
+            # Trailing headers are permitted after the last chunk;
+            # we read and discard them.
+            self.stream.read_until(b("\r\n"), self._on_chunk_trailer)
+            return
+        callback = self._body_callback
+        body = b("").join(self._body_chunks)
+        self._body_callback = None
+        self._body_streaming_callback = None
+        self._body_chunks = None
+        callback(body)
+
     def _on_request_body(self, data):
-        self.reset_connection_timeout()
         self._request.body = data
         content_type = self._request.headers.get("Content-Type", "")
         if self._request.method in ("POST", "PUT"):
@@ -474,6 +858,7 @@ class HTTPRequest(object):
        GET/POST arguments are available in the arguments property, which
        maps arguments names to lists of values (to support multiple values
        for individual names). Names and values are both unicode always.
+       The query string is not parsed until this is first accessed.
 
     .. attribute:: files
 
@@ -489,7 +874,18 @@ class HTTPRequest(object):
        be accessed through the "connection" attribute. Since connections
        are typically kept open in HTTP/1.1, multiple requests can be handled
        sequentially on a single connection.
+
+    The attributes above are stored in ``__slots__`` to keep requests
+    small.  Applications and subclasses may still set other attributes
+    on a request; these are stored in a ``__dict__`` that is only
+    created when such an attribute is first set.  Requests can also be
+    weakly referenced.
     """
+    __slots__ = ("method", "uri", "version", "headers", "body", "remote_ip",
+                 "protocol", "host", "files", "connection", "path", "query",
+                 "_arguments", "_start_time", "_finish_time", "__dict__",
+                 "__weakref__")
+
     def __init__(self, method, uri, version="HTTP/1.0", headers=None,
                  body=None, remote_ip=None, protocol=None, host=None,
                  files=None, connection=None):
@@ -525,20 +921,29 @@ class HTTPRequest(object):
         scheme, netloc, path, query, fragment = urlparse.urlsplit(native_str(uri))
         self.path = path
         self.query = query
-        arguments = parse_qs_bytes(query)
-        self.arguments = {}
-        for name, values in arguments.iteritems():
-            values = [v for v in values if v]
-            if values: self.arguments[name] = values
+        self._arguments = None
+
+    def _get_arguments(self):
+        if self._arguments is None:
+            self._arguments = {}
+            for name, values in parse_qs_bytes(self.query).iteritems():
+                values = [v for v in values if v]
+                if values: self._arguments[name] = values
+        return self._arguments
+
+    def _set_arguments(self, arguments):
+        self._arguments = arguments
+
+    arguments = property(_get_arguments, _set_arguments)
 
     def supports_http_1_1(self):
         """Returns True if this request supports HTTP/1.1 semantics"""
         return self.version == "HTTP/1.1"
 
-    def write(self, chunk):
+    def write(self, chunk, callback=None):
         """Writes the given chunk to the response stream."""
         assert isinstance(chunk, bytes_type)
-        self.connection.write(chunk)
+        self.connection.write(chunk, callback=callback)
 
     def finish(self):
         """Finishes this HTTP request on the open connection."""
@@ -48,12 +48,20 @@ class HTTPHeaders(dict):
     Content-Type: text/html
     Set-Cookie: A=B
     Set-Cookie: C=D
+
+    Like `HTTPRequest`, this class uses ``__slots__``; other attributes
+    set on headers (or on a subclass) go into a ``__dict__`` that is only
+    created when needed, and headers can be weakly referenced.
     """
+    __slots__ = ("_as_list", "_last_key", "__dict__", "__weakref__")
+
     def __init__(self, *args, **kwargs):
         # Don't pass args or kwargs to dict.__init__, as it will bypass
         # our __setitem__
         dict.__init__(self)
-        self._as_list = {}
+        # Only headers with more than one value have an entry in _as_list,
+        # which is not created until the first such header is added.
+        self._as_list = None
         self._last_key = None
         self.update(*args, **kwargs)
 
@@ -64,16 +72,26 @@ class HTTPHeaders(dict):
         norm_name = HTTPHeaders._normalize_name(name)
         self._last_key = norm_name
         if norm_name in self:
+            old_value = dict.__getitem__(self, norm_name)
             # bypass our override of __setitem__ since it modifies _as_list
-            dict.__setitem__(self, norm_name, self[norm_name] + ',' + value)
-            self._as_list[norm_name].append(value)
+            dict.__setitem__(self, norm_name, old_value + ',' + value)
+            if self._as_list is None:
+                self._as_list = {}
+            if norm_name in self._as_list:
+                self._as_list[norm_name].append(value)
+            else:
+                self._as_list[norm_name] = [old_value, value]
         else:
             self[norm_name] = value
 
     def get_list(self, name):
         """Returns all values for the given header as a list."""
         norm_name = HTTPHeaders._normalize_name(name)
-        return self._as_list.get(norm_name, [])
+        if self._as_list and norm_name in self._as_list:
+            return self._as_list[norm_name]
+        if norm_name in self:
+            return [dict.__getitem__(self, norm_name)]
+        return []
 
     def get_all(self):
         """Returns an iterable of all (name, value) pairs.
@@ -81,8 +99,12 @@ class HTTPHeaders(dict):
         If a header has multiple values, multiple pairs will be
         returned with the same name.
         """
-        for name, list in self._as_list.iteritems():
-            for value in list:
+        as_list = self._as_list or {}
+        for name, value in dict.iteritems(self):
+            if name in as_list:
+                for value in as_list[name]:
+                    yield (name, value)
+            else:
                 yield (name, value)
 
     def parse_line(self, line):
@@ -96,7 +118,8 @@ class HTTPHeaders(dict):
         if line[0].isspace():
             # continuation of a multi-line header
             new_part = ' ' + line.lstrip()
-            self._as_list[self._last_key][-1] += new_part
+            if self._as_list and self._last_key in self._as_list:
+                self._as_list[self._last_key][-1] += new_part
             dict.__setitem__(self, self._last_key,
                              self[self._last_key] + new_part)
         else:
@@ -119,10 +142,27 @@ class HTTPHeaders(dict):
 
     # dict implementation overrides
 
+    def __reduce__(self):
+        # dict's own pickling restores the items with __setitem__ before
+        # __init__ has set up _as_list, so the (name, value) pairs are
+        # pickled instead and added to a new instance.
+        return (self.__class__, (), self.__getstate__())
+
+    def __getstate__(self):
+        return (list(self.get_all()), self.__dict__ or None)
+
+    def __setstate__(self, state):
+        pairs, attrs = state
+        for name, value in pairs:
+            self.add(name, value)
+        if attrs:
+            self.__dict__.update(attrs)
+
     def __setitem__(self, name, value):
         norm_name = HTTPHeaders._normalize_name(name)
         dict.__setitem__(self, norm_name, value)
-        self._as_list[norm_name] = [value]
+        if self._as_list:
+            self._as_list.pop(norm_name, None)
 
     def __getitem__(self, name):
         return dict.__getitem__(self, HTTPHeaders._normalize_name(name))
@@ -130,7 +170,8 @@ class HTTPHeaders(dict):
     def __delitem__(self, name):
         norm_name = HTTPHeaders._normalize_name(name)
         dict.__delitem__(self, norm_name)
-        del self._as_list[norm_name]
+        if self._as_list:
+            self._as_list.pop(norm_name, None)
 
     def get(self, name, default=None):
         return dict.get(self, HTTPHeaders._normalize_name(name), default)
@@ -75,7 +75,19 @@ class IOStream(object):
         stream.connect(("friendfeed.com", 80), send_request)
         ioloop.IOLoop.instance().start()
 
+    IOStreams use ``__slots__`` to stay small when there are many idle
+    connections.  Other attributes can still be set on an IOStream or
+    a subclass; they are kept in a ``__dict__`` created on first use.
+    IOStreams can also be weakly referenced.
     """
+    __slots__ = ("socket", "io_loop", "max_buffer_size", "read_chunk_size",
+                 "_read_buffer", "_write_buffer", "_read_buffer_size",
+                 "_write_buffer_size", "_write_buffer_frozen", "_read_delimiter", "_read_regex",
+                 "_read_bytes", "_read_until_close", "_read_callback",
+                 "_streaming_callback", "_write_callback", "_close_callback",
+                 "_close_hook", "_connect_callback", "_connecting", "_state",
+                 "_pending_callbacks", "__dict__", "__weakref__")
+
     def __init__(self, socket, io_loop=None, max_buffer_size=104857600,
                  read_chunk_size=4096):
         self.socket = socket
@@ -86,6 +98,7 @@ class IOStream(object):
         self._read_buffer = collections.deque()
         self._write_buffer = collections.deque()
         self._read_buffer_size = 0
+        self._write_buffer_size = 0
         self._write_buffer_frozen = False
         self._read_delimiter = None
         self._read_regex = None
@@ -95,6 +108,10 @@ class IOStream(object):
         self._streaming_callback = None
         self._write_callback = None
         self._close_callback = None
+        # Run on close like _close_callback, but reserved for the owner of
+        # the stream (e.g. an HTTPConnection), so applications can still
+        # set their own close callback
+        self._close_hook = None
         self._connect_callback = None
         self._connecting = False
         self._state = None
@@ -202,7 +219,11 @@ class IOStream(object):
         """
         assert isinstance(data, bytes_type)
         self._check_closed()
-        self._write_buffer.append(data)
+        # An empty string would never be reported as sent, so writing
+        # nothing just runs the callback once the buffer is empty.
+        if data:
+            self._write_buffer.append(data)
+            self._write_buffer_size += len(data)
         self._write_callback = stack_context.wrap(callback)
         self._handle_write()
         if self._write_buffer:
@@ -226,6 +247,8 @@ class IOStream(object):
                 self.io_loop.remove_handler(self.socket.fileno())
             self.socket.close()
             self.socket = None
+            if self._close_hook is not None:
+                self._run_callback(self._close_hook)
             if self._close_callback:
                 self._run_callback(self._close_callback)
 
@@ -237,6 +260,10 @@ class IOStream(object):
         """Returns true if we are currently writing to the stream."""
         return bool(self._write_buffer)
 
+    def write_buffer_size(self):
+        """Returns the number of bytes written but not yet sent."""
+        return self._write_buffer_size
+
     def closed(self):
         """Returns true if the stream has been closed."""
         return self.socket is None
@@ -462,6 +489,7 @@ class IOStream(object):
                 self._write_buffer_frozen = False
                 _merge_prefix(self._write_buffer, num_bytes)
                 self._write_buffer.popleft()
+                self._write_buffer_size -= num_bytes
             except socket.error, e:
                 if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
                     self._write_buffer_frozen = True
@@ -536,6 +564,9 @@ class SSLIOStream(IOStream):
     before constructing the SSLIOStream.  Unconnected sockets will be
     wrapped when IOStream.connect is finished.
     """
+    __slots__ = ("_ssl_options", "_ssl_accepting", "_handshake_reading",
+                 "_handshake_writing")
+
     def __init__(self, *args, **kwargs):
         """Creates an SSLIOStream.
 
@@ -104,7 +104,7 @@ if hasattr(socket, 'AF_UNIX'):
         sock.listen(backlog)
         return sock
 
-def add_accept_handler(sock, callback, io_loop=None):
+def add_accept_handler(sock, callback, io_loop=None, accept_batch_size=None):
     """Adds an ``IOLoop`` event handler to accept new connections on ``sock``.
 
     When a connection is accepted, ``callback(connection, address)`` will
@@ -112,16 +112,35 @@ def add_accept_handler(sock, callback, io_loop=None):
     address of the other end of the connection).  Note that this signature
     is different from the ``callback(fd, events)`` signature used for
     ``IOLoop`` handlers.
+
+    By default all pending connections are accepted each time the socket
+    becomes readable.  If ``accept_batch_size`` is given, at most that many
+    connections are accepted per ``IOLoop`` iteration so that a burst of
+    new connections cannot starve the existing ones.
+
+    Returns a function that may be called to remove the handler (and stop
+    accepting connections) without closing the socket.
     """
     if io_loop is None:
         io_loop = IOLoop.instance()
+    removed = [False]
     def accept_handler(fd, events):
-        while True:
+        accepted = 0
+        while accept_batch_size is None or accepted < accept_batch_size:
+            if removed[0]:
+                # The callback may have stopped us in the middle of a batch
+                return
             try:
                 connection, address = sock.accept()
             except socket.error, e:
                 if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
                     return
                 raise
+            accepted += 1
             callback(connection, address)
+    def remove_handler():
+        if not removed[0]:
+            removed[0] = True
+            io_loop.remove_handler(sock.fileno())
     io_loop.add_handler(sock.fileno(), accept_handler, IOLoop.READ)
+    return remove_handler
@@ -19,12 +19,20 @@
 import errno
 import logging
 import os
+import signal
+import socket
 import sys
 import time
 
 from binascii import hexlify
 
 from tornado import ioloop
+from tornado.platform.auto import set_close_exec
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # windows
 
 try:
     import multiprocessing # Python 2.6+
@@ -61,7 +69,12 @@ def _reseed_random():
 
 _task_id = None
 
-def fork_processes(num_processes, max_restarts=100):
+# Environment variables used to hand state to a re-executed master process
+_SOCKETS_ENV = "TORNADO_SOCKET_FDS"
+_CHILDREN_ENV = "TORNADO_CHILD_PIDS"
+
+def fork_processes(num_processes, max_restarts=100, sockets=None,
+                   max_concurrent_restarts=1):
     """Starts multiple worker processes.
 
     If ``num_processes`` is None or <= 0, we detect the number of cores
@@ -84,6 +97,28 @@ def fork_processes(num_processes, max_restarts=100):
     process, ``fork_processes`` returns None if all child processes
     have exited normally, but will otherwise only exit by throwing an
     exception.
+
+    If the listening ``sockets`` shared by the children are given, the
+    parent process also supports zero-downtime restarts: on ``SIGHUP``
+    it re-executes itself (with the same command line), keeping the
+    sockets open and the existing children running.  The new parent
+    must pass the sockets returned by `inherited_sockets` to
+    ``fork_processes``, which then replaces the old children at most
+    ``max_concurrent_restarts`` at a time, starting each new child
+    before sending ``SIGTERM`` to the one it replaces and waiting for it
+    to exit.  Children should handle ``SIGTERM`` by draining their
+    server, e.g.::
+
+        sockets = process.inherited_sockets() or netutil.bind_sockets(8888)
+        process.fork_processes(0, sockets=sockets)
+        server = HTTPServer(app)
+        server.add_sockets(sockets)
+        io_loop = IOLoop.instance()
+        def on_sigterm(sig, frame):
+            io_loop.add_callback(
+                lambda: server.stop(io_loop.stop, timeout=30))
+        signal.signal(signal.SIGTERM, on_sigterm)
+        io_loop.start()
     """
     global _task_id
     assert _task_id is None
@@ -95,10 +130,19 @@ def fork_processes(num_processes, max_restarts=100):
                            "IOLoop.instance() before calling start_processes()")
     logging.info("Starting %d processes", num_processes)
     children = {}
+    old_children = {}
+    restart_requested = []
+    if sockets is not None:
+        old_children = _inherited_children()
+        def handle_sighup(sig, frame):
+            restart_requested.append(True)
+        signal.signal(signal.SIGHUP, handle_sighup)
     def start_child(i):
         pid = os.fork()
         if pid == 0:
             # child process
+            if sockets is not None:
+                signal.signal(signal.SIGHUP, signal.SIG_DFL)
             _reseed_random()
             global _task_id
             _task_id = i
@@ -106,11 +150,25 @@ def fork_processes(num_processes, max_restarts=100):
         else:
             children[pid] = i
             return None
-    for i in range(num_processes):
-        id = start_child(i)
-        if id is not None: return id
+    # Children left over from a previous master process (if any) are
+    # replaced in batches, each batch being started before the old
+    # children it replaces are stopped.
+    old_pids = dict((i, pid) for pid, i in old_children.iteritems())
+    for start in range(0, num_processes, max_concurrent_restarts):
+        batch = range(start, min(start + max_concurrent_restarts,
+                                 num_processes))
+        for i in batch:
+            id = start_child(i)
+            if id is not None: return id
+        for i in batch:
+            if i in old_pids:
+                _stop_child(old_pids.pop(i))
+    for pid in old_pids.itervalues():
+        _stop_child(pid)
     num_restarts = 0
     while children:
+        if restart_requested:
+            _reexec_master(sockets, children)
         try:
             pid, status = os.wait()
         except OSError, e:
@@ -135,6 +193,71 @@ def fork_processes(num_processes, max_restarts=100):
         new_id = start_child(id)
         if new_id is not None: return new_id
 
+def inherited_sockets():
+    """Returns the listening sockets passed on by a restarting master.
+
+    When `fork_processes` re-executes the master process on ``SIGHUP``,
+    the sockets given to it stay open across the ``exec``.  This function
+    returns them (as non-blocking socket objects) in the new process, or
+    an empty list if this process was not started that way.  Only the
+    first call returns the sockets.
+    """
+    value = os.environ.pop(_SOCKETS_ENV, None)
+    if not value:
+        return []
+    sockets = []
+    for entry in value.split(","):
+        fd, family = [int(x) for x in entry.split(":")]
+        # fromfd duplicates the descriptor, so close the original
+        sock = socket.fromfd(fd, family, socket.SOCK_STREAM)
+        os.close(fd)
+        set_close_exec(sock.fileno())
+        sock.setblocking(0)
+        sockets.append(sock)
+    return sockets
+
+def _inherited_children():
+    value = os.environ.pop(_CHILDREN_ENV, None)
+    if not value:
+        return {}
+    children = {}
+    for entry in value.split(","):
+        pid, id = [int(x) for x in entry.split(":")]
+        children[pid] = id
+    return children
+
+def _stop_child(pid):
+    logging.info("stopping old child (pid %d)", pid)
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except OSError, e:
+        if e.errno == errno.ESRCH:
+            return
+        raise
+    while True:
+        try:
+            os.waitpid(pid, 0)
+            return
+        except OSError, e:
+            if e.errno == errno.EINTR:
+                continue
+            if e.errno == errno.ECHILD:
+                return
+            raise
+
+def _reexec_master(sockets, children):
+    logging.info("Got SIGHUP, restarting master process")
+    fds = []
+    for sock in sockets:
+        fd = sock.fileno()
+        flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+        fcntl.fcntl(fd, fcntl.F_SETFD, flags & ~fcntl.FD_CLOEXEC)
+        fds.append("%d:%d" % (fd, sock.family))
+    os.environ[_SOCKETS_ENV] = ",".join(fds)
+    os.environ[_CHILDREN_ENV] = ",".join(
+        "%d:%d" % (pid, id) for pid, id in children.iteritems())
+    os.execv(sys.executable, [sys.executable] + sys.argv)
+
 def task_id():
     """Returns the current task id, if any.
 
@@ -136,6 +136,10 @@ class EscapeTestCase(unittest.TestCase):
 
             ("<>&\"", "&lt;&gt;&amp;&quot;"),
             ("&amp;", "&amp;amp;"),
+
+            (u"caf\u00e9 & 'tea'", u"caf\u00e9 &amp; 'tea'"),
+            ("nothing to escape", "nothing to escape"),
+            ("", ""),
             ]
         for unescaped, escaped in tests:
             self.assertEqual(utf8(xhtml_escape(unescaped)), utf8(escaped))
@@ -187,3 +191,12 @@ class EscapeTestCase(unittest.TestCase):
         self.assertEqual(json_decode(json_encode(u"\u00e9")), u"\u00e9")
         self.assertEqual(json_decode(json_encode(utf8(u"\u00e9"))), u"\u00e9")
         self.assertRaises(UnicodeDecodeError, json_encode, b("\xe9"))
+
+    def test_json_encode_nested(self):
+        value = {b("key"): [b("caf\xc3\xa9"), (u"</script>", 1)],
+                 u"k\u00e9y": {b("a"): None}}
+        encoded = json_encode(value)
+        self.assertTrue("</" not in encoded)
+        self.assertEqual(json_decode(encoded),
+                         {u"key": [u"caf\u00e9", [u"</script>", 1]],
+                          u"k\u00e9y": {u"a": None}})
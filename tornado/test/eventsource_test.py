@@ -0,0 +1,116 @@
+from tornado.eventsource import EventSource, EventSourceHandler
+from tornado.iostream import IOStream
+from tornado.testing import AsyncHTTPTestCase, LogTrapTestCase
+from tornado.util import b
+from tornado.web import Application
+import socket
+import time
+
+class EventSourceTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        self.source = EventSource(history_size=2, keepalive_interval=0,
+                                  max_buffer_size=1024, io_loop=self.io_loop)
+        self.logged = []
+        return Application([("/events", EventSourceHandler,
+                             dict(source=self.source))],
+                           log_function=self.logged.append)
+
+    def connect(self, headers=""):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
+        s.connect(("localhost", self.get_http_port()))
+        stream = IOStream(s, io_loop=self.io_loop)
+        stream.write(b("GET /events HTTP/1.1\r\n%s\r\n" % headers))
+        stream.read_until(b("\r\n\r\n"), self.stop)
+        header_data = self.wait()
+        self.assertTrue(header_data.startswith(b("HTTP/1.1 200")))
+        self.assertTrue(b("Content-Type: text/event-stream") in header_data)
+        return stream
+
+    def read_event(self, stream):
+        stream.read_until(b("\n\n"), self.stop)
+        return self.wait()
+
+    def test_send(self):
+        streams = [self.connect(), self.connect()]
+        self.assertEqual(self.source.subscriber_count(), 2)
+        self.source.send("hello\nworld", event="greeting")
+        self.source.send(dict(a=1))
+        for stream in streams:
+            self.assertEqual(self.read_event(stream),
+                             b("id: 1\nevent: greeting\n"
+                               "data: hello\ndata: world\n\n"))
+            self.assertEqual(self.read_event(stream),
+                             b('id: 2\ndata: {"a": 1}\n\n'))
+            stream.close()
+
+    def test_replay(self):
+        for i in range(3):
+            self.source.send(str(i))
+        # Only the last two events are kept
+        stream = self.connect("Last-Event-ID: 0\r\n")
+        self.assertEqual(self.read_event(stream), b("id: 2\ndata: 1\n\n"))
+        self.assertEqual(self.read_event(stream), b("id: 3\ndata: 2\n\n"))
+        stream.close()
+        stream = self.connect("Last-Event-ID: 2\r\n")
+        self.source.send("3")
+        self.assertEqual(self.read_event(stream), b("id: 3\ndata: 2\n\n"))
+        self.assertEqual(self.read_event(stream), b("id: 4\ndata: 3\n\n"))
+        stream.close()
+
+    def test_keepalive(self):
+        self.source.keepalive_interval = 0.01
+        stream = self.connect()
+        self.assertEqual(self.read_event(stream), b(":\n\n"))
+        stream.close()
+
+    def test_close(self):
+        stream = self.connect()
+        stream.close()
+        self.io_loop.add_timeout(time.time() + 0.1, self.stop)
+        self.wait()
+        self.assertEqual(self.source.subscriber_count(), 0)
+
+    def test_slow_subscriber(self):
+        stream = self.connect()
+        # Stop reading, and send more than the client's socket buffers
+        # and max_buffer_size can hold
+        data = "x" * 100000
+        for i in range(100):
+            self.source.send(data)
+            if not self.source.subscriber_count():
+                break
+        self.assertEqual(self.source.subscriber_count(), 0)
+        stream.read_until_close(self.stop)
+        self.wait()
+
+    def test_burst(self):
+        stream = self.connect()
+        # Events the socket accepts right away do not count against
+        # max_buffer_size, however many are sent at once
+        for i in range(10):
+            self.source.send("x" * 200)
+        self.assertEqual(self.source.subscriber_count(), 1)
+        for i in range(10):
+            self.assertTrue(self.read_event(stream).startswith(
+                    b("id: %d\n" % (i + 1))))
+        stream.close()
+
+    def test_log_on_close(self):
+        stream = self.connect()
+        self.assertEqual(self.logged, [])
+        stream.close()
+        self.io_loop.add_timeout(time.time() + 0.1, self.stop)
+        self.wait()
+        self.assertEqual(len(self.logged), 1)
+        self.assertEqual(self.logged[0].request.method, "GET")
+
+    def test_head(self):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
+        s.connect(("localhost", self.get_http_port()))
+        stream = IOStream(s, io_loop=self.io_loop)
+        stream.write(b("HEAD /events HTTP/1.0\r\n\r\n"))
+        stream.read_until_close(self.stop)
+        response = self.wait()
+        self.assertTrue(response.startswith(b("HTTP/1.0 405")))
+        self.assertTrue(b("\r\nAllow: GET\r\n") in response)
+        self.assertEqual(self.source.subscriber_count(), 0)
@@ -2,17 +2,20 @@
 
 from tornado import httpclient, simple_httpclient, netutil
 from tornado.escape import json_decode, utf8, _unicode, recursive_unicode
-from tornado.httpserver import HTTPServer
+from tornado.httpserver import HTTPServer, HTTPConnection, _shared_reaper
 from tornado.httputil import HTTPHeaders
+from tornado.ioloop import IOLoop
 from tornado.iostream import IOStream
 from tornado.simple_httpclient import SimpleAsyncHTTPClient
 from tornado.testing import AsyncHTTPTestCase, LogTrapTestCase, AsyncTestCase
 from tornado.util import b, bytes_type
-from tornado.web import Application, RequestHandler
+from tornado.web import Application, RequestHandler, asynchronous
 import os
 import shutil
 import socket
 import tempfile
+import time
+import weakref
 
 try:
     import ssl
@@ -143,6 +146,9 @@ class EchoHandler(RequestHandler):
     def get(self):
         self.write(recursive_unicode(self.request.arguments))
 
+    def post(self):
+        self.write(recursive_unicode(self.request.arguments))
+
 class TypeCheckHandler(RequestHandler):
     def prepare(self):
         self.errors = {}
@@ -178,10 +184,25 @@ class TypeCheckHandler(RequestHandler):
             self.errors[name] = "expected %s, got %s" % (expected_type, 
                                                          actual_type)
 
+class AttributeHandler(RequestHandler):
+    def get(self):
+        # Attributes not listed in __slots__ can still be set, and weak
+        # references still work
+        for obj in (self.request, self.request.headers,
+                    self.request.connection, self.request.connection.stream):
+            obj.app_data = type(obj).__name__
+            assert weakref.ref(obj)() is obj
+        self.write(dict(
+                request=self.request.app_data,
+                headers=self.request.headers.app_data,
+                connection=self.request.connection.app_data,
+                stream=self.request.connection.stream.app_data))
+
 class HTTPServerTest(AsyncHTTPTestCase, LogTrapTestCase):
     def get_app(self):
         return Application([("/echo", EchoHandler),
                             ("/typecheck", TypeCheckHandler),
+                            ("/attributes", AttributeHandler),
                             ])
 
     def test_query_string_encoding(self):
@@ -198,6 +219,319 @@ class HTTPServerTest(AsyncHTTPTestCase, LogTrapTestCase):
         data = json_decode(response.body)
         self.assertEqual(data, {})
 
+    def test_query_and_body_arguments(self):
+        response = self.fetch("/echo?foo=1", method="POST",
+                              body="foo=2&bar=3")
+        data = json_decode(response.body)
+        self.assertEqual(data, {u"foo": [u"1", u"2"], u"bar": [u"3"]})
+
+    def test_attributes(self):
+        response = self.fetch("/attributes")
+        self.assertEqual(json_decode(response.body),
+                         {u"request": u"HTTPRequest",
+                          u"headers": u"HTTPHeaders",
+                          u"connection": u"HTTPConnection",
+                          u"stream": u"IOStream"})
+
+class ChunkedBodyHandler(RequestHandler):
+    def post(self):
+        self.write(dict(body=_unicode(self.request.body),
+                        args=recursive_unicode(self.request.arguments)))
+
+class ChunkedRequestBodyTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        return Application([("/chunked", ChunkedBodyHandler)])
+
+    def get_httpserver_options(self):
+        return dict(max_body_size=1024, max_chunk_size=64)
+
+    def connect(self):
+        self.stream = IOStream(socket.socket(), io_loop=self.io_loop)
+        self.stream.connect(("localhost", self.get_http_port()), self.stop)
+        self.wait()
+
+    def raw_post(self, chunks, content_type="text/plain"):
+        self.connect()
+        self.stream.write(b("\r\n").join([
+                    b("POST /chunked HTTP/1.1"),
+                    b("Transfer-Encoding: chunked"),
+                    utf8("Content-Type: %s" % content_type),
+                    b(""), b("")]) + b("").join(chunks))
+        self.stream.read_until(b("\r\n\r\n"), self.stop)
+        header_data = self.wait()
+        start_line, sep, header_data = header_data.partition(b("\r\n"))
+        self.assertEqual(start_line, b("HTTP/1.1 200 OK"))
+        headers = HTTPHeaders.parse(header_data.decode('latin1'))
+        self.stream.read_bytes(int(headers["Content-Length"]), self.stop)
+        return json_decode(self.wait())
+
+    def test_chunked_body(self):
+        data = self.raw_post([b("4\r\nfoo=\r\n"), b("3;ext=1\r\nbar\r\n"),
+                              b("0\r\nX-Trailer: baz\r\n\r\n")])
+        self.assertEqual(data, {u"body": u"foo=bar", u"args": {}})
+
+    def test_chunked_form_body(self):
+        data = self.raw_post([b("7\r\nfoo=bar\r\n"), b("0\r\n\r\n")],
+                             "application/x-www-form-urlencoded")
+        self.assertEqual(data, {u"body": u"foo=bar",
+                                u"args": {u"foo": [u"bar"]}})
+
+    def test_chunk_too_large(self):
+        self.connect()
+        self.stream.set_close_callback(self.stop)
+        self.stream.write(b("POST /chunked HTTP/1.1\r\n"
+                            "Transfer-Encoding: chunked\r\n\r\n"
+                            "41\r\n") + b("a") * 65 + b("\r\n0\r\n\r\n"))
+        self.wait()
+        self.assertTrue(self.stream.closed())
+
+    def test_body_too_large(self):
+        self.connect()
+        self.stream.set_close_callback(self.stop)
+        self.stream.write(b("POST /chunked HTTP/1.1\r\n"
+                            "Transfer-Encoding: chunked\r\n\r\n") +
+                          (b("40\r\n") + b("a") * 64 + b("\r\n")) * 17 +
+                          b("0\r\n\r\n"))
+        self.wait()
+        self.assertTrue(self.stream.closed())
+
+class StreamingRequestBodyTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        def handle_request(request):
+            chunks = []
+            def on_body(data):
+                message = utf8(repr(chunks))
+                request.write(utf8("HTTP/1.1 200 OK\r\n"
+                                   "Content-Length: %d\r\n\r\n" %
+                                   len(message)) + message)
+                request.finish()
+            request.connection.read_body(on_body, chunks.append)
+        return handle_request
+
+    def get_httpserver_options(self):
+        return dict(stream_request_body=True)
+
+    def test_streaming_chunked_body(self):
+        stream = IOStream(socket.socket(), io_loop=self.io_loop)
+        stream.connect(("localhost", self.get_http_port()), self.stop)
+        self.wait()
+        stream.write(b("POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n"
+                       "\r\n3\r\nfoo\r\n3\r\nbar\r\n0\r\n\r\n"))
+        stream.read_until(b("\r\n\r\n"), self.stop)
+        headers = HTTPHeaders.parse(
+            self.wait().decode('latin1').partition("\r\n")[2])
+        stream.read_bytes(int(headers["Content-Length"]), self.stop)
+        self.assertEqual(self.wait(), b("['foo', 'bar']"))
+        stream.close()
+
+    def test_streaming_content_length_body(self):
+        response = self.fetch("/", method="POST", body="foobar")
+        self.assertEqual(response.body, b("['foobar']"))
+
+class StreamCloseCallbackHandler(RequestHandler):
+    def initialize(self, test):
+        self.test = test
+
+    def get(self):
+        # Setting the stream's close callback directly must not keep the
+        # server from noticing that the connection was closed
+        self.request.connection.stream.set_close_callback(
+            self.test.on_stream_closed)
+        self.write("Hello world")
+
+class MaxConnectionsTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        return Application([("/", HelloWorldRequestHandler),
+                            ("/close_callback", StreamCloseCallbackHandler,
+                             dict(test=self))])
+
+    def get_httpserver_options(self):
+        return dict(max_connections=1)
+
+    def connect(self, path="/"):
+        stream = IOStream(socket.socket(), io_loop=self.io_loop)
+        stream.connect(("localhost", self.get_http_port()), self.stop)
+        self.wait()
+        stream.write(utf8("GET %s HTTP/1.1\r\n\r\n" % path))
+        return stream
+
+    def test_max_connections(self):
+        stream1 = self.connect()
+        stream1.read_until(b("Hello world"), self.stop)
+        self.wait()
+        self.assertEqual(self.http_server.num_connections(), 1)
+
+        # The second connection waits in the backlog while the first
+        # (keep-alive) connection is open
+        stream2 = self.connect()
+        stream2.read_until(b("Hello world"), self.stop)
+        self.io_loop.add_timeout(time.time() + 0.1,
+                                 lambda: self.stop("timeout"))
+        self.assertEqual(self.wait(), "timeout")
+        self.assertEqual(self.http_server.num_connections(), 1)
+
+        stream1.close()
+        self.assertTrue(self.wait().endswith(b("Hello world")))
+        self.assertEqual(self.http_server.num_connections(), 1)
+        stream2.close()
+
+    def test_stream_close_callback(self):
+        self.stream_closed = False
+        stream1 = self.connect("/close_callback")
+        stream1.read_until(b("Hello world"), self.stop)
+        self.wait()
+        stream2 = self.connect()
+        stream2.read_until(b("Hello world"), self.stop)
+        stream1.close()
+        # The second connection is only accepted once the first one has
+        # been removed from the count
+        self.assertTrue(self.wait().endswith(b("Hello world")))
+        self.assertTrue(self.stream_closed)
+        self.assertEqual(self.http_server.num_connections(), 1)
+        stream2.close()
+
+    def on_stream_closed(self):
+        self.stream_closed = True
+
+class ConnectionTimeoutTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        return Application([("/", HelloWorldRequestHandler)])
+
+    def get_httpserver_options(self):
+        return dict(header_timeout=0.1, body_timeout=0.1, idle_timeout=0.1)
+
+    def connect(self, data):
+        stream = IOStream(socket.socket(), io_loop=self.io_loop)
+        stream.connect(("localhost", self.get_http_port()), self.stop)
+        self.wait()
+        stream.set_close_callback(self.stop)
+        stream.write(data)
+        return stream
+
+    def check_reaped(self, stream, rule):
+        self.wait()
+        self.assertTrue(stream.closed())
+        reaped = dict(header=0, body=0, idle=0)
+        reaped[rule] = 1
+        self.assertEqual(self.http_server.reaped_connections(), reaped)
+
+    def test_header_timeout(self):
+        stream = self.connect(b("GET / HTTP/1.1\r\n"))
+        self.check_reaped(stream, "header")
+
+    def test_body_timeout(self):
+        stream = self.connect(b("POST / HTTP/1.1\r\n"
+                                "Content-Length: 10\r\n\r\n12345"))
+        self.check_reaped(stream, "body")
+
+    def test_idle_timeout(self):
+        stream = self.connect(b("GET / HTTP/1.1\r\n\r\n"))
+        stream.read_until(b("Hello world"), self.stop)
+        self.wait()
+        self.check_reaped(stream, "idle")
+
+class StandaloneConnectionTest(AsyncTestCase, LogTrapTestCase):
+    def test_shared_reaper(self):
+        # Connections created without an HTTPServer share one reaper
+        # per IOLoop and timeout
+        pairs = [socket.socketpair() for i in range(2)]
+        streams = [IOStream(server, io_loop=self.io_loop)
+                   for (server, client) in pairs]
+        connections = [HTTPConnection(stream, ("127.0.0.1", 0), None,
+                                      connection_timeout=0.1)
+                       for stream in streams]
+        reaper = connections[0]._reaper
+        self.assertTrue(connections[1]._reaper is reaper)
+        self.assertTrue(_shared_reaper(self.io_loop, 0.1) is reaper)
+        self.assertFalse(_shared_reaper(self.io_loop, 0.2) is reaper)
+        io_loop = IOLoop()
+        try:
+            self.assertFalse(_shared_reaper(io_loop, 0.1) is reaper)
+        finally:
+            io_loop.close()
+
+        for stream in streams:
+            stream.set_close_callback(self.stop)
+        self.wait(condition=lambda: all(s.closed() for s in streams))
+        self.assertEqual(reaper.reaped["header"], 2)
+        for server, client in pairs:
+            client.close()
+
+class DrainHandler(RequestHandler):
+    def initialize(self, test):
+        self.test = test
+
+    @asynchronous
+    def get(self):
+        self.test.pending = self
+        self.test.stop()
+
+class DrainTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        return Application([("/hello", HelloWorldRequestHandler),
+                            ("/drain", DrainHandler, dict(test=self))])
+
+    def connect(self, path):
+        stream = IOStream(socket.socket(), io_loop=self.io_loop)
+        stream.connect(("localhost", self.get_http_port()), self.stop)
+        self.wait()
+        stream.write(utf8("GET %s HTTP/1.1\r\n\r\n" % path))
+        return stream
+
+    def test_drain(self):
+        idle = self.connect("/hello")
+        idle.read_until(b("Hello world"), self.stop)
+        self.wait()
+        active = self.connect("/drain")
+        self.wait()
+        self.assertEqual(self.http_server.num_connections(), 2)
+
+        events = []
+        def on_event(event):
+            events.append(event)
+            self.stop()
+        def on_drained():
+            # No connection may be left when the callback runs
+            on_event(("drained", self.http_server.num_connections()))
+        idle.set_close_callback(lambda: on_event("idle closed"))
+        self.http_server.stop(on_drained)
+        self.wait()
+        # The in-flight request keeps the server from draining
+        self.io_loop.add_timeout(time.time() + 0.05, self.stop)
+        self.wait()
+        self.assertEqual(events, ["idle closed"])
+        # but new connections are refused
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
+        try:
+            self.assertRaises(socket.error, s.connect,
+                              ("localhost", self.get_http_port()))
+        finally:
+            s.close()
+
+        events.append("finish")
+        self.pending.finish("done")
+        response = []
+        def on_response(data):
+            response.append(data)
+            self.stop()
+        active.read_until_close(on_response)
+        self.wait(condition=lambda: len(events) == 3 and response)
+        self.assertEqual(events, ["idle closed", "finish", ("drained", 0)])
+        # The whole response was sent before the connection was closed
+        self.assertTrue(response[0].startswith(b("HTTP/1.1 200")))
+        self.assertTrue(b("\r\nConnection: close\r\n") in response[0])
+        self.assertTrue(response[0].endswith(b("\r\n\r\ndone")))
+
+    def test_drain_timeout(self):
+        stream = self.connect("/drain")
+        self.wait()
+        self.http_server.stop(lambda: self.stop("drained"), timeout=0.1)
+        self.assertEqual(self.wait(), "drained")
+        self.assertEqual(self.http_server.num_connections(), 1)
+        stream.set_close_callback(self.stop)
+        self.wait()
+        self.assertEqual(self.http_server.num_connections(), 0)
+
 class UnixSocketTest(AsyncTestCase, LogTrapTestCase):
     """HTTPServers can listen on Unix sockets too.
 
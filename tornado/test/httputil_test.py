@@ -4,7 +4,9 @@ from tornado.httputil import url_concat, parse_multipart_form_data, HTTPHeaders
 from tornado.escape import utf8
 from tornado.testing import LogTrapTestCase
 from tornado.util import b
+import copy
 import logging
+import pickle
 import unittest
 
 
@@ -138,3 +140,37 @@ Foo: even
                          [("Asdf", "qwer zxcv"),
                           ("Foo", "bar baz"),
                           ("Foo", "even more lines")])
+
+    def test_replace_and_delete(self):
+        headers = HTTPHeaders()
+        headers.add("Set-Cookie", "A=B")
+        headers.add("Set-Cookie", "C=D")
+        headers["Content-Type"] = "text/html"
+        self.assertEqual(headers.get_list("set-cookie"), ["A=B", "C=D"])
+        headers["Set-Cookie"] = "E=F"
+        self.assertEqual(headers.get_list("set-cookie"), ["E=F"])
+        headers.add("Set-Cookie", "G=H")
+        self.assertEqual(headers["Set-Cookie"], "E=F,G=H")
+        del headers["set-cookie"]
+        self.assertEqual(headers.get_list("set-cookie"), [])
+        self.assertEqual(list(headers.get_all()),
+                         [("Content-Type", "text/html")])
+
+    def test_pickle(self):
+        headers = HTTPHeaders()
+        headers.add("Set-Cookie", "A=B")
+        headers.add("Set-Cookie", "C=D")
+        headers["Content-Type"] = "text/html"
+        headers.origin = "test"
+        copies = [pickle.loads(pickle.dumps(headers, protocol))
+                  for protocol in range(pickle.HIGHEST_PROTOCOL + 1)]
+        copies.append(copy.copy(headers))
+        for h in copies:
+            self.assertEqual(type(h), HTTPHeaders)
+            self.assertEqual(h, headers)
+            self.assertEqual(sorted(h.get_all()), sorted(headers.get_all()))
+            self.assertEqual(h.get_list("set-cookie"), ["A=B", "C=D"])
+            self.assertEqual(h.origin, "test")
+            h.add("Content-Type", "text/plain")
+            self.assertEqual(h.get_list("content-type"),
+                             ["text/html", "text/plain"])
@@ -10,6 +10,7 @@ class ImportTest(unittest.TestCase):
         # import tornado.curl_httpclient  # depends on pycurl
         # import tornado.database  # depends on MySQLdb
         import tornado.escape
+        import tornado.eventsource
         import tornado.httpclient
         import tornado.httpserver
         import tornado.httputil
@@ -1,9 +1,10 @@
 from tornado import netutil
-from tornado.iostream import IOStream
+from tornado.iostream import IOStream, SSLIOStream
 from tornado.testing import AsyncHTTPTestCase, LogTrapTestCase, get_unused_port
 from tornado.util import b
 from tornado.web import RequestHandler, Application
 import socket
+import weakref
 
 class HelloHandler(RequestHandler):
     def get(self):
@@ -13,6 +14,14 @@ class TestIOStream(AsyncHTTPTestCase, LogTrapTestCase):
     def get_app(self):
         return Application([('/', HelloHandler)])
 
+    def test_weakref(self):
+        for cls in (IOStream, SSLIOStream):
+            stream = cls(socket.socket(), io_loop=self.io_loop)
+            try:
+                self.assertTrue(weakref.ref(stream)() is stream)
+            finally:
+                stream.close()
+
     def make_iostream_pair(self):
         port = get_unused_port()
         [listener] = netutil.bind_sockets(port, '127.0.0.1',
@@ -116,6 +125,21 @@ class TestIOStream(AsyncHTTPTestCase, LogTrapTestCase):
             server.close()
             client.close()
 
+    def test_write_callback(self):
+        server, client = self.make_iostream_pair()
+        try:
+            server.write(b("1234"), callback=self.stop)
+            self.wait()
+            # writing nothing still runs the callback
+            server.write(b(""), callback=self.stop)
+            self.wait()
+            client.read_bytes(4, self.stop)
+            data = self.wait()
+            self.assertEqual(data, b("1234"))
+        finally:
+            server.close()
+            client.close()
+
     def test_streaming_until_close(self):
         server, client = self.make_iostream_pair()
         try:
@@ -3,14 +3,22 @@
 import logging
 import os
 import signal
+import sys
+import unittest
+from tornado import process
 from tornado.httpclient import HTTPClient, HTTPError
 from tornado.httpserver import HTTPServer
 from tornado.ioloop import IOLoop
 from tornado.netutil import bind_sockets
-from tornado.process import fork_processes, task_id
+from tornado.process import fork_processes, task_id, inherited_sockets
 from tornado.testing import LogTrapTestCase, get_unused_port
 from tornado.web import RequestHandler, Application
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # windows
+
 # Not using AsyncHTTPTestCase because we need control over the IOLoop.
 # Logging is tricky here so you may want to replace LogTrapTestCase
 # with unittest.TestCase when debugging.
@@ -109,6 +117,123 @@ class ProcessTest(LogTrapTestCase):
             raise
             
 
+class InheritedSocketsTest(unittest.TestCase):
+    def test_inherited_sockets(self):
+        self.assertEqual(inherited_sockets(), [])
+        port = get_unused_port()
+        [sock] = bind_sockets(port, "127.0.0.1")
+        fd = os.dup(sock.fileno())
+        family = sock.family
+        sock.close()
+        os.environ["TORNADO_SOCKET_FDS"] = "%d:%d" % (fd, family)
+        [inherited] = inherited_sockets()
+        try:
+            self.assertEqual(inherited.getsockname(), ("127.0.0.1", port))
+            self.assertFalse("TORNADO_SOCKET_FDS" in os.environ)
+            self.assertEqual(inherited_sockets(), [])
+        finally:
+            inherited.close()
+
+class _Exec(Exception):
+    pass
+
+class FakeOS(object):
+    """Stands in for the os module in tornado.process.
+
+    Records the process management calls instead of making them.  Forked
+    children get pids from 201 up and exit normally when waited for.
+    """
+    def __init__(self, environ):
+        self.environ = environ
+        self.events = []
+        self.next_pid = 201
+        self.children = []
+        self.on_wait = None
+
+    def __getattr__(self, name):
+        return getattr(os, name)
+
+    def fork(self):
+        pid = self.next_pid
+        self.next_pid += 1
+        self.children.append(pid)
+        self.events.append(("fork", pid))
+        return pid
+
+    def kill(self, pid, sig):
+        self.events.append(("kill", pid, sig))
+
+    def waitpid(self, pid, options):
+        self.events.append(("waitpid", pid))
+        return pid, 0
+
+    def wait(self):
+        if self.on_wait is not None:
+            self.on_wait()
+        pid = self.children.pop(0)
+        return pid, 0
+
+    def execv(self, path, args):
+        self.events.append(("execv", path, args))
+        raise _Exec()
+
+class RollingRestartTest(LogTrapTestCase):
+    def setUp(self):
+        super(RollingRestartTest, self).setUp()
+        # fork_processes refuses to run once the IOLoop exists
+        self.io_loop = IOLoop.__dict__.get("_instance")
+        if self.io_loop is not None:
+            del IOLoop._instance
+        self.sighup_handler = signal.getsignal(signal.SIGHUP)
+        self.os = FakeOS({})
+        process.os = self.os
+
+    def tearDown(self):
+        process.os = os
+        signal.signal(signal.SIGHUP, self.sighup_handler)
+        if self.io_loop is not None:
+            IOLoop._instance = self.io_loop
+        super(RollingRestartTest, self).tearDown()
+
+    def test_replace_old_children(self):
+        # Children of the previous master, as pid:task id
+        self.os.environ["TORNADO_CHILD_PIDS"] = "101:0,102:1,103:2"
+        self.assertEqual(fork_processes(3, sockets=[],
+                                        max_concurrent_restarts=2), None)
+        self.assertFalse("TORNADO_CHILD_PIDS" in self.os.environ)
+        # Each batch is started before the children it replaces are
+        # stopped, and stopped children are waited for
+        self.assertEqual(self.os.events, [
+                ("fork", 201), ("fork", 202),
+                ("kill", 101, signal.SIGTERM), ("waitpid", 101),
+                ("kill", 102, signal.SIGTERM), ("waitpid", 102),
+                ("fork", 203),
+                ("kill", 103, signal.SIGTERM), ("waitpid", 103)])
+
+    def test_sighup(self):
+        [sock] = bind_sockets(get_unused_port(), "127.0.0.1")
+        try:
+            def on_wait():
+                self.os.on_wait = None
+                os.kill(os.getpid(), signal.SIGHUP)
+            self.os.on_wait = on_wait
+            self.assertRaises(_Exec, fork_processes, 2, sockets=[sock])
+            # The master re-executes itself after reaping the first child
+            self.assertEqual(self.os.events, [
+                    ("fork", 201), ("fork", 202),
+                    ("execv", sys.executable, [sys.executable] + sys.argv)])
+            self.assertEqual(self.os.environ, {
+                    "TORNADO_SOCKET_FDS": "%d:%d" % (sock.fileno(),
+                                                     sock.family),
+                    "TORNADO_CHILD_PIDS": "202:1"})
+            # The socket stays open across the exec
+            flags = fcntl.fcntl(sock.fileno(), fcntl.F_GETFD)
+            self.assertFalse(flags & fcntl.FD_CLOEXEC)
+        finally:
+            sock.close()
+
 if os.name != 'posix':
     # All sorts of unixisms here
     del ProcessTest
+    del InheritedSocketsTest
+    del RollingRestartTest
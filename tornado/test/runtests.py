@@ -2,11 +2,13 @@
 import unittest
 
 TEST_MODULES = [
+    'tornado.eventsource.doctests',
     'tornado.httputil.doctests',
     'tornado.iostream.doctests',
     'tornado.util.doctests',
     'tornado.test.curl_httpclient_test',
     'tornado.test.escape_test',
+    'tornado.test.eventsource_test',
     'tornado.test.httpclient_test',
     'tornado.test.httpserver_test',
     'tornado.test.httputil_test',
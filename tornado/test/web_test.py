@@ -1,15 +1,25 @@
-from tornado.escape import json_decode, utf8, to_unicode, recursive_unicode, native_str
+from tornado.escape import json_decode, json_encode, utf8, to_unicode, recursive_unicode, native_str
 from tornado.iostream import IOStream
 from tornado.template import DictLoader
 from tornado.testing import LogTrapTestCase, AsyncHTTPTestCase
 from tornado.util import b, bytes_type
-from tornado.web import RequestHandler, _O, authenticated, Application, asynchronous, url, HTTPError
+from tornado.web import RequestHandler, _O, authenticated, Application, asynchronous, url, HTTPError, _URLRouter, _literal_prefix, GZipContentEncoding, ChunkedTransferEncoding, StaticFileHandler, _LRUCache, cached, AccessLog
 
 import binascii
+import calendar
+import email.utils
+import hashlib
 import logging
+import os
 import re
+import shutil
 import socket
 import sys
+import tempfile
+import threading
+import time
+import unittest
+import zlib
 
 class CookieTestRequestHandler(RequestHandler):
     # stub out enough methods to make the secure_cookie functions work
@@ -52,6 +62,20 @@ class SecureCookieTest(LogTrapTestCase):
         # it gets rejected
         assert handler.get_secure_cookie('foo') is None
 
+    def test_verified_cookie_cache(self):
+        handler = CookieTestRequestHandler()
+        handler.set_secure_cookie('foo', b('bar'))
+        cookie = handler._cookies['foo']
+        self.assertEqual(handler.get_secure_cookie('foo'), b('bar'))
+        key = ('0123456789', 'foo', cookie)
+        self.assertEqual(RequestHandler._secure_cookie_cache[key][0], b('bar'))
+        # a cached cookie still expires
+        self.assertEqual(handler.get_secure_cookie('foo', max_age_days=-1),
+                         None)
+        # and is not valid under another secret
+        handler.application.settings['cookie_secret'] = 'abcdefghij'
+        self.assertEqual(handler.get_secure_cookie('foo'), None)
+
 class CookieTest(AsyncHTTPTestCase, LogTrapTestCase):
     def get_app(self):
         class SetCookieHandler(RequestHandler):
@@ -195,6 +219,34 @@ class ConnectionCloseTest(AsyncHTTPTestCase, LogTrapTestCase):
         logging.info('connection closed')
         self.stop()
 
+class FlushCallbackHandler(RequestHandler):
+    @asynchronous
+    def get(self):
+        self.chunks = [b("A") * 100000, b("B") * 100000, b(""), b("C")]
+        self.flushed = []
+        self.send_chunk()
+
+    def send_chunk(self):
+        # Each chunk is only written once the previous one has been sent
+        if self.flushed:
+            assert not self.request.connection.stream.writing()
+        if not self.chunks:
+            self.finish()
+            return
+        self.flushed.append(True)
+        self.write(self.chunks.pop(0))
+        self.flush(callback=self.send_chunk)
+
+class FlushCallbackTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        return Application([('/', FlushCallbackHandler)])
+
+    def test_flush_callback(self):
+        response = self.fetch("/")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body,
+                         b("A") * 100000 + b("B") * 100000 + b("C"))
+
 class EchoHandler(RequestHandler):
     def get(self, path):
         # Type checks: web.py interfaces convert argument values to
@@ -478,3 +530,736 @@ class ErrorResponseTest(AsyncHTTPTestCase, LogTrapTestCase):
         response = self.fetch("/failed_write_error")
         self.assertEqual(response.code, 500)
         self.assertEqual(b(""), response.body)
+
+class HeaderHandler(RequestHandler):
+    def get(self):
+        self.set_status(201)
+        self.set_header("X-Number", 42)
+        self._headers["X-Unicode"] = u"value"
+        self.write("created")
+
+class ResponseHeaderTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        return Application([("/", HeaderHandler)])
+
+    def test_headers(self):
+        # The second time, the encoded header names are reused
+        for i in range(2):
+            response = self.fetch("/")
+            self.assertEqual(response.code, 201)
+            self.assertEqual(response.body, b("created"))
+            self.assertEqual(response.headers["X-Number"], "42")
+            self.assertEqual(response.headers["X-Unicode"], "value")
+        date = email.utils.parsedate(response.headers["Date"])
+        self.assertTrue(abs(calendar.timegm(date) - time.time()) < 5)
+
+class GZipHandler(RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", self.get_argument("type"))
+        self.write("a" * int(self.get_argument("size")))
+
+class SmallGZipContentEncoding(GZipContentEncoding):
+    CONTENT_TYPES = set(["text/plain"])
+    MIN_LENGTH = 10
+    GZIP_LEVEL = 1
+
+class GZipTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        return Application([("/gzip", GZipHandler)],
+                           transforms=[SmallGZipContentEncoding,
+                                       ChunkedTransferEncoding])
+
+    def fetch_gzip(self, size, type="text/plain"):
+        return self.fetch("/gzip?size=%d&type=%s" % (size, type),
+                          use_gzip=False,
+                          headers={"Accept-Encoding": "gzip"})
+
+    def test_gzip(self):
+        response = self.fetch_gzip(100)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(int(response.headers["Content-Length"]),
+                         len(response.body))
+        self.assertEqual(zlib.decompress(response.body, 16 + zlib.MAX_WBITS),
+                         b("a") * 100)
+
+    def test_min_length(self):
+        response = self.fetch_gzip(5)
+        self.assertTrue("Content-Encoding" not in response.headers)
+        self.assertEqual(response.body, b("aaaaa"))
+
+    def test_content_types(self):
+        response = self.fetch_gzip(100, "text/html")
+        self.assertTrue("Content-Encoding" not in response.headers)
+
+class IterHandler(RequestHandler):
+    STREAM_BUFFER_SIZE = 100
+
+    def initialize(self, test):
+        self.test = test
+
+    def get(self):
+        self.set_header("Content-Type", "text/plain")
+        return self.lines()
+
+    def lines(self):
+        try:
+            for i in xrange(1000):
+                if self.get_argument("fail", None) == str(i):
+                    raise Exception("failed at %d" % i)
+                # Lines are only produced when earlier output has been sent
+                buffered = self.request.connection.stream._write_buffer
+                assert sum(map(len, buffered)) < 2 * self.STREAM_BUFFER_SIZE
+                yield "line %d\n" % i
+                if i == 10:
+                    self.test.on_line_10()
+        finally:
+            self.test.on_iter_closed()
+
+class WriteIterHandler(RequestHandler):
+    @asynchronous
+    def get(self):
+        self.write(iter(["a", "b", "c"]))
+        # Headers can still be set
+        self.set_header("X-Iter", "1")
+
+class IterTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        return Application([("/iter", IterHandler, dict(test=self)),
+                            ("/write_iter", WriteIterHandler)],
+                           transforms=[SmallGZipContentEncoding,
+                                       ChunkedTransferEncoding])
+
+    def on_line_10(self):
+        pass
+
+    def on_iter_closed(self):
+        self.iter_closed = True
+
+    def test_iter(self):
+        self.iter_closed = False
+        response = self.fetch("/iter")
+        self.assertEqual(response.headers["Transfer-Encoding"], "chunked")
+        self.assertEqual(response.body, b("").join(
+                [utf8("line %d\n" % i) for i in xrange(1000)]))
+        self.assertTrue(self.iter_closed)
+
+    def test_gzip(self):
+        response = self.fetch("/iter", use_gzip=False,
+                              headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(zlib.decompress(response.body, 16 + zlib.MAX_WBITS),
+                         b("").join([utf8("line %d\n" % i)
+                                     for i in xrange(1000)]))
+
+    def test_write_iter(self):
+        response = self.fetch("/write_iter")
+        self.assertEqual(response.body, b("abc"))
+        self.assertEqual(response.headers["X-Iter"], "1")
+
+    def test_error(self):
+        # before anything is sent
+        response = self.fetch("/iter?fail=0")
+        self.assertEqual(response.code, 500)
+        # after the headers are sent, the connection is closed
+        response = self.fetch("/iter?fail=500")
+        self.assertEqual(response.code, 599)
+
+    def test_connection_close(self):
+        self.iter_closed = False
+        def on_line_10():
+            self.stream.close()
+        def on_iter_closed():
+            self.iter_closed = True
+            self.stop()
+        self.on_line_10 = on_line_10
+        self.on_iter_closed = on_iter_closed
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
+        s.connect(("localhost", self.get_http_port()))
+        self.stream = IOStream(s, io_loop=self.io_loop)
+        self.stream.write(b("GET /iter HTTP/1.0\r\n\r\n"))
+        self.wait()
+        self.assertTrue(self.iter_closed)
+
+class UncachedStaticFileHandler(StaticFileHandler):
+    CACHE_CHECK_INTERVAL = 0
+
+class PrecompressedStaticTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def setUp(self):
+        self.static_path = tempfile.mkdtemp()
+        self.css = b("body { color: red; }\n") * 100
+        f = open(os.path.join(self.static_path, "style.css"), "wb")
+        f.write(self.css)
+        f.close()
+        super(PrecompressedStaticTest, self).setUp()
+
+    def tearDown(self):
+        super(PrecompressedStaticTest, self).tearDown()
+        shutil.rmtree(self.static_path)
+
+    def get_app(self):
+        return Application([("/uncached/(.*)", UncachedStaticFileHandler,
+                             dict(path=self.static_path))],
+                           static_path=self.static_path,
+                           static_precompress=True)
+
+    def test_precompressed(self):
+        self.assertTrue(os.path.exists(
+                os.path.join(self.static_path, "style.css.gz")))
+        response = self.fetch("/static/style.css", use_gzip=False,
+                              headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Content-Type"], "text/css")
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertEqual(zlib.decompress(response.body, 16 + zlib.MAX_WBITS),
+                         self.css)
+
+        response = self.fetch("/static/style.css", use_gzip=False)
+        self.assertTrue("Content-Encoding" not in response.headers)
+        self.assertEqual(response.body, self.css)
+
+    def test_stale(self):
+        path = os.path.join(self.static_path, "style.css")
+        mtime = os.stat(path).st_mtime
+        os.utime(path + ".gz", (mtime - 10, mtime - 10))
+        response = self.fetch("/uncached/style.css", use_gzip=False,
+                              headers={"Accept-Encoding": "gzip"})
+        self.assertTrue("Content-Encoding" not in response.headers)
+        self.assertEqual(response.body, self.css)
+        StaticFileHandler.precompress(self.static_path)
+        response = self.fetch("/uncached/style.css", use_gzip=False,
+                              headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+
+class StaticFileCacheTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def setUp(self):
+        self.static_path = tempfile.mkdtemp()
+        self.path = os.path.join(self.static_path, "robots.txt")
+        self.write_file(b("User-agent: *\n"))
+        super(StaticFileCacheTest, self).setUp()
+
+    def tearDown(self):
+        super(StaticFileCacheTest, self).tearDown()
+        shutil.rmtree(self.static_path)
+
+    def write_file(self, content, mtime=1000000000):
+        f = open(self.path, "wb")
+        f.write(content)
+        f.close()
+        os.utime(self.path, (mtime, mtime))
+
+    def get_app(self):
+        return Application([("/uncached/(.*)", UncachedStaticFileHandler,
+                             dict(path=self.static_path))],
+                           static_path=self.static_path)
+
+    def test_cached(self):
+        response = self.fetch("/robots.txt")
+        self.assertEqual(response.body, b("User-agent: *\n"))
+        etag = response.headers["Etag"]
+        self.assertEqual(self.fetch("/robots.txt", headers={
+                    "If-None-Match": etag}).code, 304)
+        # Within the check interval the file is not looked at again
+        self.write_file(b("Disallow: /\n"))
+        self.assertEqual(self.fetch("/robots.txt").body,
+                         b("User-agent: *\n"))
+
+    def test_changed(self):
+        self.assertEqual(self.fetch("/uncached/robots.txt").body,
+                         b("User-agent: *\n"))
+        self.write_file(b("Disallow: /\n"), mtime=1000000010)
+        response = self.fetch("/uncached/robots.txt")
+        self.assertEqual(response.body, b("Disallow: /\n"))
+        os.remove(self.path)
+        self.assertEqual(self.fetch("/uncached/robots.txt").code, 404)
+
+    def test_lru(self):
+        cache = _LRUCache()
+        files = {}
+        for name in "abc":
+            files[name] = _O(cache_size=lambda: 10)
+            cache.put(name, files[name], 25)
+        self.assertEqual(cache.get("a"), None)
+        self.assertTrue(cache.get("b") is files["b"])
+        cache.put("d", _O(cache_size=lambda: 10), 25)
+        self.assertEqual(cache.get("c"), None)
+        self.assertTrue(cache.get("b") is files["b"])
+        self.assertEqual(cache.size, 20)
+
+class StreamingStaticFileHandler(StaticFileHandler):
+    CACHE_MAX_FILE_SIZE = 0
+    STREAM_CHUNK_SIZE = 1000
+
+class StaticRangeTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def setUp(self):
+        self.static_path = tempfile.mkdtemp()
+        self.data = b("").join(utf8("%05d" % i) for i in range(2000))
+        f = open(os.path.join(self.static_path, "data.bin"), "wb")
+        f.write(self.data)
+        f.close()
+        super(StaticRangeTest, self).setUp()
+
+    def tearDown(self):
+        super(StaticRangeTest, self).tearDown()
+        shutil.rmtree(self.static_path)
+
+    def get_app(self):
+        return Application([("/streamed/(.*)", StreamingStaticFileHandler,
+                             dict(path=self.static_path))],
+                           static_path=self.static_path)
+
+    def check_ranges(self, prefix):
+        url = prefix + "data.bin"
+        response = self.fetch(url)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Accept-Ranges"], "bytes")
+        self.assertEqual(response.body, self.data)
+        etag = response.headers["Etag"]
+
+        for range, start, end in [("bytes=10-19", 10, 20),
+                                  ("bytes=9995-", 9995, 10000),
+                                  ("bytes=-7", 9993, 10000),
+                                  ("bytes=1000-99999", 1000, 10000)]:
+            response = self.fetch(url, headers={"Range": range})
+            self.assertEqual(response.code, 206)
+            self.assertEqual(response.body, self.data[start:end])
+            self.assertEqual(response.headers["Content-Range"],
+                             "bytes %d-%d/10000" % (start, end - 1))
+
+        # Several ranges, or a stale If-Range, get the whole file
+        response = self.fetch(url, headers={"Range": "bytes=1-2,5-6"})
+        self.assertEqual((response.code, response.body), (200, self.data))
+        response = self.fetch(url, headers={"Range": "bytes=1-2",
+                                            "If-Range": '"old"'})
+        self.assertEqual((response.code, response.body), (200, self.data))
+        response = self.fetch(url, headers={"Range": "bytes=1-2",
+                                            "If-Range": etag})
+        self.assertEqual((response.code, response.body), (206, b("00")))
+
+        response = self.fetch(url, headers={"Range": "bytes=10000-"})
+        self.assertEqual(response.code, 416)
+        self.assertEqual(response.headers["Content-Range"], "bytes */10000")
+
+        response = self.fetch(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.code, 304)
+        last_modified = response.headers["Last-Modified"]
+        response = self.fetch(url, headers={
+                "If-Modified-Since": last_modified})
+        self.assertEqual(response.code, 304)
+        # If-None-Match takes precedence over If-Modified-Since
+        response = self.fetch(url, headers={
+                "If-None-Match": '"old"', "If-Modified-Since": last_modified})
+        self.assertEqual((response.code, response.body), (200, self.data))
+        self.assertEqual(response.headers["Etag"], etag)
+
+    def test_cached(self):
+        self.check_ranges("/static/")
+
+    def test_streamed(self):
+        self.check_ranges("/streamed/")
+
+class StaticURLHandler(RequestHandler):
+    def get(self, path):
+        self.write(self.static_url(path))
+
+class StaticManifestTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def setUp(self):
+        self.static_path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.static_path, "js"))
+        self.write_file("js/app.js", "var a;")
+        self.write_file("style.css", "body {}")
+        self.manifest_path = os.path.join(self.static_path, "manifest.json")
+        self.write_file("manifest.json", json_encode(
+                {"style.css": "0123456789abcdef"}))
+        super(StaticManifestTest, self).setUp()
+
+    def tearDown(self):
+        super(StaticManifestTest, self).tearDown()
+        shutil.rmtree(self.static_path)
+
+    def write_file(self, path, content, mtime=None):
+        path = os.path.join(self.static_path, path)
+        f = open(path, "wb")
+        f.write(utf8(content))
+        f.close()
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def get_app(self):
+        return Application([("/url/(.*)", StaticURLHandler)],
+                           static_path=self.static_path,
+                           static_manifest=self.manifest_path)
+
+    def test_build_manifest(self):
+        manifest = StaticFileHandler.build_manifest(self.static_path)
+        self.assertEqual(sorted(manifest.keys()),
+                         ["js/app.js", "manifest.json", "style.css"])
+        self.assertEqual(manifest["js/app.js"],
+                         hashlib.md5(b("var a;")).hexdigest())
+
+    def test_manifest(self):
+        # The signature comes from the manifest, not the file
+        self.assertEqual(self.fetch("/url/style.css").body,
+                         b("/static/style.css?v=01234"))
+        # Files missing from the manifest are still hashed when used
+        self.assertEqual(self.fetch("/url/js/app.js").body,
+                         utf8("/static/js/app.js?v=" +
+                              hashlib.md5(b("var a;")).hexdigest()[:5]))
+
+    def test_debug(self):
+        self._app.settings["debug"] = True
+        self.write_file("style.css", "a {}", mtime=1000000000)
+        self.assertEqual(self.fetch("/url/style.css").body,
+                         utf8("/static/style.css?v=" +
+                              hashlib.md5(b("a {}")).hexdigest()[:5]))
+        self.write_file("style.css", "b {}", mtime=1000000010)
+        self.assertEqual(self.fetch("/url/style.css").body,
+                         utf8("/static/style.css?v=" +
+                              hashlib.md5(b("b {}")).hexdigest()[:5]))
+
+class EtagHandler(RequestHandler):
+    def get(self):
+        for i in range(int(self.get_argument("parts", "3"))):
+            self.write("part %d\n" % i)
+
+class EarlyEtagHandler(RequestHandler):
+    rendered = 0
+
+    def get(self):
+        if self.check_etag('"v1"'):
+            return
+        EarlyEtagHandler.rendered += 1
+        self.write("version 1")
+
+class EtagTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        return Application([("/etag", EtagHandler),
+                            ("/early", EarlyEtagHandler)],
+                           etag_max_size=100)
+
+    def test_incremental(self):
+        response = self.fetch("/etag")
+        self.assertEqual(response.headers["Etag"], '"%s"' % hashlib.sha1(
+                    b("part 0\npart 1\npart 2\n")).hexdigest())
+        response = self.fetch("/etag", headers={
+                "If-None-Match": response.headers["Etag"]})
+        self.assertEqual(response.code, 304)
+
+    def test_max_size(self):
+        response = self.fetch("/etag?parts=20")
+        self.assertEqual(response.code, 200)
+        self.assertTrue("Etag" not in response.headers)
+
+    def test_crc32(self):
+        self._app.settings["etag_hash"] = "crc32"
+        response = self.fetch("/etag")
+        self.assertEqual(response.headers["Etag"], '"%08x"' % (zlib.crc32(
+                    b("part 0\npart 1\npart 2\n")) & 0xffffffff))
+
+    def test_check_etag(self):
+        EarlyEtagHandler.rendered = 0
+        response = self.fetch("/early")
+        self.assertEqual(response.headers["Etag"], '"v1"')
+        self.assertEqual(response.body, b("version 1"))
+        response = self.fetch("/early", headers={"If-None-Match": '"v1"'})
+        self.assertEqual(response.code, 304)
+        self.assertEqual(EarlyEtagHandler.rendered, 1)
+
+class CachedHandler(RequestHandler):
+    calls = 0
+
+    @cached(ttl=60, vary=("Accept-Language",))
+    def get(self):
+        CachedHandler.calls += 1
+        if self.get_argument("cookie", None):
+            self.set_cookie("c", "1")
+        self.set_header("Content-Type", "text/plain")
+        self.write("%s %s\n" % (self.request.headers.get("Accept-Language"),
+                                 "x" * 2000))
+    head = get
+
+class ExpiringHandler(RequestHandler):
+    @cached(ttl=0)
+    def get(self):
+        self.write("hello")
+
+class ResponseCacheTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        return Application([("/cached", CachedHandler),
+                            ("/expiring", ExpiringHandler)], gzip=True)
+
+    def setUp(self):
+        super(ResponseCacheTest, self).setUp()
+        CachedHandler.calls = 0
+        CachedHandler.get.cache.clear()
+
+    def fetch_body(self, path, **kwargs):
+        response = self.fetch(path, **kwargs)
+        self.assertEqual(response.code, 200)
+        return response.body
+
+    def test_cached(self):
+        cache = CachedHandler.get.cache
+        hits, misses = cache.hits, cache.misses
+        body = self.fetch_body("/cached")
+        self.assertEqual(self.fetch_body("/cached"), body)
+        self.assertEqual(CachedHandler.calls, 1)
+        self.assertEqual((cache.hits - hits, cache.misses - misses), (1, 1))
+        # Query strings and Vary headers are part of the key
+        self.fetch_body("/cached?a=1")
+        self.fetch_body("/cached", headers={"Accept-Language": "fr"})
+        self.assertEqual(CachedHandler.calls, 3)
+
+    def test_gzip(self):
+        plain = self.fetch("/cached", use_gzip=False)
+        gzipped = self.fetch("/cached", use_gzip=False,
+                             headers={"Accept-Encoding": "gzip"})
+        self.assertTrue("Content-Encoding" not in plain.headers)
+        self.assertEqual(gzipped.headers["Content-Encoding"], "gzip")
+        again = self.fetch("/cached", use_gzip=False,
+                           headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(again.body, gzipped.body)
+        self.assertEqual(again.headers["Content-Encoding"], "gzip")
+        self.assertEqual(CachedHandler.calls, 2)
+
+    def test_not_modified(self):
+        etag = self.fetch("/cached").headers["Etag"]
+        response = self.fetch("/cached", headers={"If-None-Match": etag})
+        self.assertEqual(response.code, 304)
+        self.assertEqual(CachedHandler.calls, 1)
+
+    def raw_fetch(self, request):
+        # Returns the response headers.  simple_httpclient always uses
+        # HTTP/1.1 and waits for a body after HEAD responses.
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
+        s.connect(("localhost", self.get_http_port()))
+        stream = IOStream(s, io_loop=self.io_loop)
+        stream.write(b(request))
+        stream.read_until(b("\r\n\r\n"), self.stop)
+        headers = self.wait()
+        stream.close()
+        return headers
+
+    def test_connection_header(self):
+        keep_alive = "GET /cached HTTP/1.0\r\nConnection: Keep-Alive\r\n\r\n"
+        close = "GET /cached HTTP/1.0\r\n\r\n"
+        self.assertTrue(b("Connection: Keep-Alive") in self.raw_fetch(keep_alive))
+        self.assertTrue(b("Connection:") not in self.raw_fetch(close))
+        self.assertTrue(b("Connection: Keep-Alive") in self.raw_fetch(keep_alive))
+        self.assertEqual(CachedHandler.calls, 1)
+
+    def test_head(self):
+        # The HTTP version and host are part of the key, so use the ones
+        # simple_httpclient sends
+        head = ("HEAD /cached HTTP/1.1\r\nHost: localhost:%d\r\n"
+                "Connection: close\r\n\r\n" % self.get_http_port())
+        # HEAD requests don't fill the cache
+        self.raw_fetch(head)
+        self.raw_fetch(head)
+        self.assertEqual(CachedHandler.calls, 2)
+        # but are answered from GET responses
+        body = self.fetch_body("/cached", use_gzip=False)
+        headers = self.raw_fetch(head)
+        self.assertTrue(headers.startswith(b("HTTP/1.1 200")))
+        self.assertTrue(utf8("Content-Length: %d" % len(body)) in headers)
+        self.assertEqual(CachedHandler.calls, 3)
+        self.assertEqual(self.fetch_body("/cached", use_gzip=False), body)
+        self.assertEqual(CachedHandler.calls, 3)
+
+    def test_not_cached(self):
+        self.fetch_body("/cached?cookie=1")
+        self.fetch_body("/cached?cookie=1")
+        self.assertEqual(CachedHandler.calls, 2)
+        cache = ExpiringHandler.get.cache
+        hits = cache.hits
+        self.fetch_body("/expiring")
+        self.fetch_body("/expiring")
+        self.assertEqual(cache.hits, hits)
+
+class RenderHandler(RequestHandler):
+    def get(self):
+        self.render("page.html", name="world")
+
+class PrepareRedirectHandler(RequestHandler):
+    def prepare(self):
+        self.redirect("/render")
+
+class PhaseStatsHandler(RequestHandler):
+    def get(self):
+        self.write(self.application.phase_stats.get_stats())
+
+class PhaseTimingTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        self.handlers = []
+        return Application([url("/render", RenderHandler, name="render"),
+                            ("/stats", PhaseStatsHandler),
+                            ("/prepare_redirect", PrepareRedirectHandler)],
+                           # Templates are cached by path
+                           template_path="phase_timing",
+                           template_loader=DictLoader(
+                               {"page.html": "Hello {{ name }}"}),
+                           phase_stats=True,
+                           log_function=self.handlers.append)
+
+    def test_phase_times(self):
+        response = self.fetch("/render")
+        self.assertEqual(response.body, b("Hello world"))
+        [handler] = self.handlers
+        times = handler.phase_times
+        self.assertEqual(sorted(times.keys()), sorted(handler.PHASES))
+        for phase in handler.PHASES:
+            self.assertTrue(times["headers"] <= times[phase] <= times["finish"])
+        self.assertTrue(times["render"] <= times["first_byte"])
+
+    def test_finished_in_prepare(self):
+        response = self.fetch("/prepare_redirect", follow_redirects=False)
+        self.assertEqual(response.code, 302)
+        [handler] = self.handlers
+        self.assertEqual(sorted(handler.phase_times.keys()),
+                         ["body", "finish", "first_byte", "headers"])
+
+    def test_stats(self):
+        self.fetch("/render")
+        self.fetch("/render")
+        self.fetch("/missing")
+        stats = json_decode(self.fetch("/stats").body)
+        self.assertEqual(sorted(stats.keys()), ["ErrorHandler", "render"])
+        self.assertEqual(sorted(stats["render"].keys()),
+                         sorted(RequestHandler.PHASES[1:]))
+        finish = stats["render"]["finish"]
+        self.assertEqual(finish["count"], 2)
+        self.assertEqual(sum(count for bound, count in finish["buckets"]), 2)
+        self.assertEqual(finish["buckets"][-1][0], None)
+        self.assertTrue("render" not in stats["ErrorHandler"])
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+class HelloHandler(RequestHandler):
+    def get(self):
+        self.write("hello")
+
+class AccessLogTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        self.logger = logging.getLogger("tornado.test.access")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.list_handler = ListHandler()
+        self.logger.addHandler(self.list_handler)
+        self.access_log = AccessLog(self.logger, flush_interval=0.01)
+        return Application([("/", HelloHandler)],
+                           access_log=self.access_log, log_phases=True)
+
+    def tearDown(self):
+        self.access_log.close()
+        self.logger.removeHandler(self.list_handler)
+        super(AccessLogTest, self).tearDown()
+
+    def test_access_log(self):
+        self.fetch("/")
+        self.fetch("/missing")
+        self.access_log.close()
+        self.assertEqual(self.access_log.written, 2)
+        records = self.list_handler.records
+        self.assertEqual([r.levelno for r in records],
+                         [logging.INFO, logging.WARNING])
+        message = records[0].getMessage()
+        self.assertTrue(message.startswith("200 GET / (127.0.0.1) "), message)
+        self.assertTrue("first_byte=" in message, message)
+
+    def test_dropped(self):
+        access_log = AccessLog(self.logger, max_queue_size=2,
+                               flush_interval=0.01)
+        # Block the background thread in the first record it writes
+        emitting = threading.Event()
+        proceed = threading.Event()
+        class BlockingHandler(logging.Handler):
+            def emit(self, record):
+                emitting.set()
+                proceed.wait(5)
+        blocking_handler = BlockingHandler()
+        self.logger.addHandler(blocking_handler)
+        try:
+            handler = _O(get_status=lambda: 200,
+                         _request_summary=lambda: "GET /",
+                         request=_O(request_time=lambda: 0.001))
+            access_log.log(handler)
+            emitting.wait(5)
+            for i in range(4):
+                access_log.log(handler)
+            self.assertEqual(access_log.dropped, 2)
+            proceed.set()
+            access_log.close()
+            self.assertEqual(access_log.written, 3)
+        finally:
+            proceed.set()
+            self.logger.removeHandler(blocking_handler)
+
+class URLRouterTest(unittest.TestCase):
+    def test_literal_prefix(self):
+        cases = [("/foo/bar$", ("/foo/bar", True)),
+                 (r"/favicon\.ico$", ("/favicon.ico", True)),
+                 ("/static/(.*)$", ("/static/", False)),
+                 ("/user/[0-9]+$", ("/user/", False)),
+                 ("/items?$", ("/item", False)),
+                 ("/a|/b$", ("", False)),
+                 (r"/\d+$", ("/", False)),
+                 (".*$", ("", False)),
+                 ]
+        for pattern, expected in cases:
+            self.assertEqual(_literal_prefix(re.compile(pattern)), expected)
+
+    def test_first_match(self):
+        specs = [url(p, RequestHandler) for p in [
+                "/a/b", "/a/(.*)", "/a/c", "/b/c", "/b/(c|d)", r"/c\.html",
+                "/d/(?P<x>[0-9]+)/e", "/d/1/e", "(?i)/E", "/f/?", ".*"]]
+        router = _URLRouter(specs)
+        paths = ["/a/b", "/a/c", "/a/", "/b/c", "/b/d", "/c.html", "/cxhtml",
+                 "/d/1/e", "/d/2/e", "/e", "/f", "/f/", "/", "/nothing/here"]
+        for path in paths:
+            expected = None
+            for spec in specs:
+                if spec.regex.match(path):
+                    expected = spec
+                    break
+            self.assertTrue(router.find(path)[0] is expected, path)
+
+    def test_added_specs(self):
+        specs = [url("/a", RequestHandler)]
+        router = _URLRouter(specs)
+        self.assertEqual(router.find("/b"), (None, None))
+        specs.append(url("/b", RequestHandler))
+        self.assertTrue(router.find("/b")[0] is specs[1])
+
+class HostLookupTest(unittest.TestCase):
+    def get_handlers(self, app, host, headers={}):
+        return app._get_host_handlers(_O(host=host, headers=headers))
+
+    def test_host_lookup(self):
+        app = Application([("/", RequestHandler)], default_host="default")
+        app.add_handlers(r"www\.example\.com", [("/www", RequestHandler)])
+        app.add_handlers(r".*\.example\.com", [("/any", RequestHandler)])
+        app.add_handlers(r"api\.example\.com", [("/api", RequestHandler)])
+        app.add_handlers(r"default", [("/default", RequestHandler)])
+        def pattern(host, headers={}):
+            return self.get_handlers(app, host, headers)[0].regex.pattern
+        for i in range(2):
+            # second iteration answers from the cache
+            self.assertEqual(pattern("www.example.com"), "/www$")
+            self.assertEqual(pattern("WWW.example.com:8888"), "/www$")
+            # api.example.com is shadowed by the earlier wildcard pattern
+            self.assertEqual(pattern("api.example.com"), "/any$")
+            self.assertEqual(pattern("other.com"), "/$")
+        app.add_handlers(r"other\.com", [("/other", RequestHandler)])
+        self.assertEqual(pattern("other.com"), "/other$")
+
+    def test_default_host(self):
+        app = Application(default_host="default")
+        app.add_handlers(r"default", [("/default", RequestHandler)])
+        self.assertEqual(len(self.get_handlers(app, "other.com")), 1)
+        self.assertEqual(self.get_handlers(app, "other.com",
+                                           {"X-Real-Ip": "1.2.3.4"}), None)
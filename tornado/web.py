@@ -52,22 +52,26 @@ back to the main thread before finishing the request.
 from __future__ import with_statement
 
 import Cookie
+import atexit
 import base64
 import binascii
+import bisect
 import calendar
+import collections
 import datetime
 import email.utils
 import functools
-import gzip
 import hashlib
 import hmac
 import httplib
 import logging
 import mimetypes
 import os.path
+import Queue
 import re
 import stat
 import sys
+import threading
 import time
 import tornado
 import traceback
@@ -75,6 +79,7 @@ import types
 import urllib
 import urlparse
 import uuid
+import zlib
 
 from tornado import escape
 from tornado import locale
@@ -83,11 +88,6 @@ from tornado import template
 from tornado.escape import utf8, _unicode
 from tornado.util import b, bytes_type, import_object
 
-try:
-    from io import BytesIO  # python 3
-except ImportError:
-    from cStringIO import StringIO as BytesIO  # python 2
-
 class RequestHandler(object):
     """Subclass this class and define get() or post() to make a handler.
 
@@ -97,22 +97,26 @@ class RequestHandler(object):
     """
     SUPPORTED_METHODS = ("GET", "HEAD", "POST", "DELETE", "PUT", "OPTIONS")
 
+    # The route this handler was found by; set by Application
+    _route = None
+
     def __init__(self, application, request, **kwargs):
         self.application = application
         self.request = request
+        # When each phase of the request was reached; see PHASES
+        self.phase_times = {"headers": request._start_time,
+                            "body": time.time()}
         self._headers_written = False
         self._finished = False
         self._auto_finish = True
-        self._transforms = None  # will be set in _execute
-        self.ui = _O((n, self._ui_method(m)) for n, m in
-                     application.ui_methods.iteritems())
-        self.ui["modules"] = _O((n, self._ui_module(n, m)) for n, m in
-                                application.ui_modules.iteritems())
+        self._transform_classes = None  # will be set in _execute
+        self._transforms = None  # will be set in the first flush
+        self._ui = None
         self.clear()
         # Check since connection is not available in WSGI
         if hasattr(self.request, "connection"):
-            self.request.connection.stream.set_close_callback(
-                self.on_connection_close)
+            self.request.connection.set_close_callback(
+                self._on_connection_close)
         self.initialize(**kwargs)
 
     def initialize(self):
@@ -141,6 +145,17 @@ class RequestHandler(object):
         """An alias for `self.application.settings`."""
         return self.application.settings
 
+    @property
+    def ui(self):
+        """The ui_methods and ui_modules available to templates."""
+        if self._ui is None:
+            self._ui = _O((n, self._ui_method(m)) for n, m in
+                          self.application.ui_methods.iteritems())
+            self._ui["modules"] = _O(
+                (n, self._ui_module(n, m)) for n, m in
+                self.application.ui_modules.iteritems())
+        return self._ui
+
     def head(self, *args, **kwargs):
         raise HTTPError(405)
 
@@ -167,6 +182,16 @@ class RequestHandler(object):
         """
         pass
 
+    # The phases of handling a request, in order, as keys of phase_times:
+    # the request headers were parsed, the body was received, prepare()
+    # returned, the HTTP method returned (or finished the request),
+    # render() produced the last page, the response headers were written,
+    # and finish() was called.  Phases that did not happen (such as
+    # rendering) are left out.  A method that finishes the request itself
+    # renders and writes the response before it returns.
+    PHASES = ("headers", "body", "prepare", "method", "render", "first_byte",
+              "finish")
+
     def on_connection_close(self):
         """Called in async handlers if the client closed the connection.
 
@@ -180,11 +205,16 @@ class RequestHandler(object):
         """
         pass
 
+    def _on_connection_close(self):
+        self._close_body_iter()
+        self.on_connection_close()
+
     def clear(self):
         """Resets all headers and content for this response."""
         self._headers = {
-            "Server": "TornadoServer/%s" % tornado.version,
-            "Content-Type": "text/html; charset=UTF-8",
+            "Server": _SERVER_HEADER,
+            "Content-Type": _DEFAULT_CONTENT_TYPE,
+            "Date": _http_date(),
         }
         self.set_default_headers()
         if not self.request.supports_http_1_1():
@@ -192,6 +222,10 @@ class RequestHandler(object):
                 self.set_header("Connection", "Keep-Alive")
         self._write_buffer = []
         self._status_code = 200
+        # Hash of what has been written so far for the default etag;
+        # None if nothing has been hashed yet, False once no etag applies.
+        self._etag_hasher = None
+        self._etag_size = 0
 
     def set_default_headers(self):
         """Override this to set HTTP headers at the beginning of the request.
@@ -229,9 +263,10 @@ class RequestHandler(object):
                 raise ValueError("Unsafe header value %r", value)
         elif isinstance(value, datetime.datetime):
             t = calendar.timegm(value.utctimetuple())
-            value = email.utils.formatdate(t, localtime=False, usegmt=True)
+            value = utf8(email.utils.formatdate(t, localtime=False,
+                                                usegmt=True))
         elif isinstance(value, int) or isinstance(value, long):
-            value = str(value)
+            value = utf8(str(value))
         else:
             raise TypeError("Unsupported header value %r" % value)
         self._headers[name] = value
@@ -382,10 +417,29 @@ class RequestHandler(object):
         value = b("|").join([value, timestamp, signature])
         return value
 
+    # Cookies that have passed verification in get_secure_cookie, as a map
+    # from (cookie_secret, name, value) to (decoded value, timestamp).
+    # It is emptied when it fills up.
+    _secure_cookie_cache = {}
+    _SECURE_COOKIE_CACHE_SIZE = 10000
+
     def get_secure_cookie(self, name, value=None, max_age_days=31):
-        """Returns the given signed cookie if it validates, or None."""
+        """Returns the given signed cookie if it validates, or None.
+
+        Verified cookies are remembered, so a cookie that is sent with
+        every request is only checked against its signature once (its
+        age is still checked every time).
+        """
         if value is None: value = self.get_cookie(name)
         if not value: return None
+        key = (self.application.settings.get("cookie_secret"), name, value)
+        cached = RequestHandler._secure_cookie_cache.get(key)
+        if cached is not None:
+            decoded, timestamp = cached
+            if timestamp < time.time() - max_age_days * 86400:
+                logging.warning("Expired cookie %r", value)
+                return None
+            return decoded
         parts = utf8(value).split(b("|"))
         if len(parts) != 3: return None
         signature = self._cookie_signature(name, parts[0], parts[1])
@@ -407,9 +461,14 @@ class RequestHandler(object):
         if parts[1].startswith(b("0")):
             logging.warning("Tampered cookie %r", value)
         try:
-            return base64.b64decode(parts[0])
+            decoded = base64.b64decode(parts[0])
         except Exception:
             return None
+        cache = RequestHandler._secure_cookie_cache
+        if len(cache) >= self._SECURE_COOKIE_CACHE_SIZE:
+            cache.clear()
+        cache[key] = (decoded, timestamp)
+        return decoded
 
     def _cookie_signature(self, *parts):
         self.require_setting("cookie_secret", "secure cookies")
@@ -443,16 +502,118 @@ class RequestHandler(object):
         cross-site security vulnerability.  All JSON output should be
         wrapped in a dictionary.  More details at
         http://haacked.com/archive/2008/11/20/anatomy-of-a-subtle-json-vulnerability.aspx
+
+        If the given chunk is an iterator (or if an HTTP method returns
+        one), its items are written as they are produced, and the response
+        is finished when it is exhausted::
+
+            def get(self):
+                self.set_header("Content-Type", "text/csv")
+                return ("%s,%s\n" % (row.id, row.name)
+                        for row in self.db.iter("SELECT id, name FROM users"))
+
+        Items are only taken from the iterator while less than
+        ``STREAM_BUFFER_SIZE`` bytes wait to be sent to the client, so
+        large responses are sent with bounded memory.  They pass through
+        the output transforms (such as chunked encoding and gzip) as they
+        go.  Nothing else may be written after an iterator, but headers
+        can still be set until the current callback returns.  If the
+        client closes the connection, the iterator's ``close()`` method
+        is called if it has one.
         """
         if self._finished:
             raise RuntimeError("Cannot write() after finish().  May be caused "
                                "by using async operations without the "
                                "@asynchronous decorator.")
+        if self._body_iter is not None:
+            raise RuntimeError("Cannot write() after writing an iterator")
         if isinstance(chunk, dict):
             chunk = escape.json_encode(chunk)
             self.set_header("Content-Type", "application/json; charset=UTF-8")
+        elif hasattr(chunk, "next"):
+            self._write_iter(chunk)
+            return
         chunk = utf8(chunk)
         self._write_buffer.append(chunk)
+        if self._etag_hasher is not False:
+            self._update_etag(chunk)
+
+    # How many bytes taken from an iterator passed to write() may be
+    # waiting to be sent before we stop taking more
+    STREAM_BUFFER_SIZE = 64 * 1024
+
+    # The iterator being written, if any
+    _body_iter = None
+
+    def _write_iter(self, iterator):
+        if self.application._wsgi:
+            # No way to stream the response, so send it all at once
+            for chunk in iterator:
+                self.write(chunk)
+            return
+        self._body_iter = iterator
+        self._auto_finish = False
+        # Start on the next IOLoop iteration so the caller can set headers
+        self.request.connection.stream.io_loop.add_callback(
+            self._send_body_iter)
+
+    def _send_body_iter(self):
+        iterator = self._body_iter
+        if iterator is None:
+            # The connection was closed
+            return
+        # Unset while writing so write() accepts the items
+        self._body_iter = None
+        try:
+            size = 0
+            while size < self.STREAM_BUFFER_SIZE:
+                try:
+                    chunk = iterator.next()
+                except StopIteration:
+                    self.finish()
+                    return
+                self.write(chunk)
+                size += len(self._write_buffer[-1])
+        except Exception, e:
+            self._body_iter = iterator
+            self._close_body_iter()
+            if self._headers_written:
+                # Too late for an error page, but the response must not
+                # look complete to the client
+                logging.error("Uncaught exception writing %s",
+                              self._request_summary(), exc_info=True)
+                self._finished = True
+                self.request.connection.stream.close()
+            else:
+                self._handle_request_exception(e)
+            return
+        self._body_iter = iterator
+        # The callback runs when everything has been sent
+        self.flush(callback=self._send_body_iter)
+
+    def _close_body_iter(self):
+        iterator = self._body_iter
+        self._body_iter = None
+        if hasattr(iterator, "close"):
+            try:
+                iterator.close()
+            except Exception:
+                logging.error("Error closing iterator", exc_info=True)
+
+    def _update_etag(self, chunk):
+        if ("Etag" in self._headers or
+            self.request.method not in ("GET", "HEAD")):
+            self._etag_hasher = False
+            return
+        self._etag_size += len(chunk)
+        max_size = self.settings.get("etag_max_size")
+        if max_size is not None and self._etag_size > max_size:
+            self._etag_hasher = False
+            return
+        if self._etag_hasher is None:
+            self._etag_hasher = _ETAG_HASHES[
+                self.settings.get("etag_hash", "sha1")]()
+        self._etag_hasher.update(chunk)
 
     def render(self, template_name, **kwargs):
         """Renders the template with the given arguments as the response."""
@@ -533,6 +694,7 @@ class RequestHandler(object):
         if html_bodies:
             hloc = html.index(b('</body>'))
             html = html[:hloc] + b('').join(html_bodies) + b('\n') + html[hloc:]
+        self.phase_times["render"] = time.time()
         self.finish(html)
 
     def render_string(self, template_name, **kwargs):
@@ -581,19 +743,49 @@ class RequestHandler(object):
         return template.Loader(template_path, **kwargs)
 
 
-    def flush(self, include_footers=False):
-        """Flushes the current output buffer to the network."""
+    def flush(self, include_footers=False, callback=None):
+        """Flushes the current output buffer to the network.
+
+        If a callback is given, it is run when all the output written so
+        far has been handed to the socket.  This can be used to write
+        large responses piece by piece without buffering all of them::
+
+            @tornado.web.asynchronous
+            def get(self):
+                self.pages_left = 100
+                self.send_page()
+
+            def send_page(self):
+                self.write(generate_report_page())
+                self.pages_left -= 1
+                if self.pages_left:
+                    self.flush(callback=self.send_page)
+                else:
+                    self.finish()
+
+        If the client closes the connection, the callback is never run;
+        override `on_connection_close` to clean up in that case.  Only one
+        callback can be pending: a callback passed to an earlier flush that
+        has not been run yet is replaced.
+        """
         if self.application._wsgi:
             raise Exception("WSGI applications do not support flush()")
 
         chunk = b("").join(self._write_buffer)
         self._write_buffer = []
+        # Etags only apply to responses that are sent all at once
+        self._etag_hasher = False
         if not self._headers_written:
             self._headers_written = True
+            self.phase_times["first_byte"] = time.time()
+            self._transforms = [t(self.request)
+                                for t in self._transform_classes]
             for transform in self._transforms:
                 self._headers, chunk = transform.transform_first_chunk(
                     self._headers, chunk, include_footers)
             headers = self._generate_headers()
+            if self._response_cache is not None and include_footers:
+                self._store_cached_response(chunk)
         else:
             for transform in self._transforms:
                 chunk = transform.transform_chunk(chunk, include_footers)
@@ -601,11 +793,10 @@ class RequestHandler(object):
 
         # Ignore the chunk and only write the headers for HEAD requests
         if self.request.method == "HEAD":
-            if headers: self.request.write(headers)
-            return
+            chunk = b("")
 
-        if headers or chunk:
-            self.request.write(headers + chunk)
+        if headers or chunk or callback is not None:
+            self.request.write(headers + chunk, callback=callback)
 
     def finish(self, chunk=None):
         """Finishes this response, ending the HTTP request."""
@@ -620,16 +811,18 @@ class RequestHandler(object):
         # we have not flushed any content yet.
         if not self._headers_written:
             if (self._status_code == 200 and
-                self.request.method in ("GET", "HEAD") and
-                "Etag" not in self._headers):
-                etag = self.compute_etag()
+                self.request.method in ("GET", "HEAD")):
+                if "Etag" in self._headers:
+                    etag = self._headers["Etag"]
+                else:
+                    etag = self.compute_etag()
+                    if etag is not None:
+                        self.set_header("Etag", etag)
                 if etag is not None:
                     inm = self.request.headers.get("If-None-Match")
                     if inm and inm.find(etag) != -1:
                         self._write_buffer = []
                         self.set_status(304)
-                    else:
-                        self.set_header("Etag", etag)
             if "Content-Length" not in self._headers:
                 content_length = sum(len(part) for part in self._write_buffer)
                 self.set_header("Content-Length", content_length)
@@ -639,14 +832,26 @@ class RequestHandler(object):
             # set on the IOStream (which would otherwise prevent the
             # garbage collection of the RequestHandler when there
             # are keepalive connections)
-            self.request.connection.stream.set_close_callback(None)
+            self.request.connection.set_close_callback(None)
 
         if not self.application._wsgi:
             self.flush(include_footers=True)
             self.request.finish()
+        self._end_phases()
+        if not self.application._wsgi:
             self._log()
         self._finished = True
 
+    def _end_phases(self):
+        now = self.phase_times["finish"] = time.time()
+        if "prepare" in self.phase_times:
+            # finish() was called by the HTTP method
+            self.phase_times.setdefault("method", now)
+        stats = self.application.phase_stats
+        if stats is not None:
+            stats.add(self._route or self.__class__.__name__,
+                      self.phase_times)
+
     def send_error(self, status_code=500, **kwargs):
         """Sends the given HTTP error code to the browser.
 
@@ -878,18 +1083,24 @@ class RequestHandler(object):
         full host for every static URL, including the "http://". Set
         this attribute for handlers whose output needs non-relative static
         path names.
+
+        Signatures are computed the first time a file is used, unless they
+        were loaded from a manifest by the `Application` (see the
+        ``static_manifest`` setting).  In debug mode, a signature is
+        recomputed when the modification time of its file changes.
         """
         self.require_setting("static_path", "static_url")
-        if not hasattr(RequestHandler, "_static_hashes"):
-            RequestHandler._static_hashes = {}
         hashes = RequestHandler._static_hashes
         abs_path = os.path.join(self.application.settings["static_path"],
                                 path)
+        if self.settings.get("debug"):
+            mtime = _get_mtime(abs_path)
+            if RequestHandler._static_mtimes.get(abs_path) != mtime:
+                hashes.pop(abs_path, None)
+                RequestHandler._static_mtimes[abs_path] = mtime
         if abs_path not in hashes:
             try:
-                f = open(abs_path, "rb")
-                hashes[abs_path] = hashlib.md5(f.read()).hexdigest()
-                f.close()
+                hashes[abs_path] = _hash_file(abs_path)
             except Exception:
                 logging.error("Could not open static file %r", path)
                 hashes[abs_path] = None
@@ -901,6 +1112,10 @@ class RequestHandler(object):
         else:
             return base + static_url_prefix + path
 
+    # Signatures of static files, by absolute path; see static_url
+    _static_hashes = {}
+    _static_mtimes = {}
+
     def async_callback(self, callback, *args, **kwargs):
         """Obsolete - catches exceptions from the wrapped function.
 
@@ -936,11 +1151,41 @@ class RequestHandler(object):
 
         May be overridden to provide custom etag implementations,
         or may return None to disable tornado's default etag support.
+
+        The default etag is a hash of the response body, which is updated
+        by each call to `write`.  The hash function is chosen with the
+        ``etag_hash`` application setting: "sha1" (the default), "md5" or
+        the much cheaper "crc32".  No etag is computed for responses
+        longer than the ``etag_max_size`` setting, if it is given.
+        """
+        if self._etag_hasher is False:
+            return None
+        if self._etag_hasher is None:
+            # Nothing has been written
+            self._etag_hasher = _ETAG_HASHES[
+                self.settings.get("etag_hash", "sha1")]()
+        return '"%s"' % self._etag_hasher.hexdigest()
+
+    def check_etag(self, etag):
+        """Sets the Etag header and checks it against If-None-Match.
+
+        Returns True, and sets the status to 304, if the client already
+        has the current version of the response.  This lets a handler
+        that can tell the version of its response cheaply skip producing
+        the body::
+
+            def get(self, id):
+                entry = self.db.get("SELECT * FROM entries WHERE id = %s", id)
+                if self.check_etag('"%d"' % entry.version):
+                    return
+                self.render("entry.html", entry=entry)
         """
-        hasher = hashlib.sha1()
-        for part in self._write_buffer:
-            hasher.update(part)
-        return '"%s"' % hasher.hexdigest()
+        self.set_header("Etag", etag)
+        inm = self.request.headers.get("If-None-Match")
+        if inm and inm.find(etag) != -1:
+            self.set_status(304)
+            return True
+        return False
 
     def _stack_context_handle_exception(self, type, value, traceback):
         try:
@@ -954,8 +1199,11 @@ class RequestHandler(object):
         return True
 
     def _execute(self, transforms, *args, **kwargs):
-        """Executes this request with the given output transforms."""
-        self._transforms = transforms
+        """Executes this request with the given output transform classes.
+
+        The transforms are instantiated when the response is first flushed.
+        """
+        self._transform_classes = transforms
         try:
             if self.request.method not in self.SUPPORTED_METHODS:
                 raise HTTPError(405)
@@ -965,25 +1213,90 @@ class RequestHandler(object):
                self.application.settings.get("xsrf_cookies"):
                 self.check_xsrf_cookie()
             self.prepare()
+            # If prepare() finished the request, its timings have already
+            # been recorded
             if not self._finished:
+                self.phase_times["prepare"] = time.time()
                 args = [self.decode_argument(arg) for arg in args]
                 kwargs = dict((k, self.decode_argument(v, name=k))
                               for (k,v) in kwargs.iteritems())
-                getattr(self, self.request.method.lower())(*args, **kwargs)
+                result = getattr(self, self.request.method.lower())(
+                    *args, **kwargs)
+                if "method" not in self.phase_times:
+                    self.phase_times["method"] = time.time()
+                if hasattr(result, "next") and not self._finished:
+                    self.write(result)
                 if self._auto_finish and not self._finished:
                     self.finish()
         except Exception, e:
             self._handle_request_exception(e)
 
+    # The _ResponseCache and key a response should be stored under;
+    # set by the cached decorator
+    _response_cache = None
+
+    # Headers that clear() sets for each request and connection; they are
+    # not stored with cached responses
+    _UNCACHED_HEADERS = frozenset(["Connection", "Date"])
+
+    def _store_cached_response(self, body):
+        cache, key = self._response_cache
+        # Responses that set cookies are likely to be specific to a user
+        if (self._status_code == 200 and
+            not getattr(self, "_new_cookies", None)):
+            cache.put(key, dict((name, value) for (name, value)
+                                in self._headers.iteritems()
+                                if name not in self._UNCACHED_HEADERS),
+                      body)
+
+    def _finish_cached(self, response):
+        """Sends a response stored by the `cached` decorator."""
+        # Keep the Date and Connection headers set by clear() for this
+        # request
+        self._headers.update(response.headers)
+        body = response.body
+        etag = self._headers.get("Etag")
+        inm = self.request.headers.get("If-None-Match")
+        if etag is not None and inm and inm.find(etag) != -1:
+            self.set_status(304)
+            self.set_header("Content-Length", 0)
+            body = b("")
+        if self.request.method == "HEAD":
+            body = b("")
+        self._headers_written = True
+        self.phase_times["first_byte"] = time.time()
+        self.request.write(self._generate_headers() + body)
+        if hasattr(self.request, "connection"):
+            self.request.connection.set_close_callback(None)
+        self.request.finish()
+        self._end_phases()
+        self._log()
+        self._finished = True
+
     def _generate_headers(self):
-        lines = [utf8(self.request.version + " " +
-                      str(self._status_code) +
-                      " " + httplib.responses[self._status_code])]
-        lines.extend([(utf8(n) + b(": ") + utf8(v)) for n, v in self._headers.iteritems()])
+        # The connection will be closed after this response (e.g. because
+        # the server is draining), so tell the client
+        connection = getattr(self.request, "connection", None)
+        if getattr(connection, "no_keep_alive", False):
+            self._headers["Connection"] = b("close")
+        lines = [_STATUS_LINES.get((self.request.version, self._status_code))
+                 or _status_line(self.request.version, self._status_code)]
+        # set_header stores values as bytes, but they may also have been
+        # put in self._headers directly
+        for name, value in self._headers.iteritems():
+            try:
+                lines.append(_HEADER_PREFIXES[name])
+            except KeyError:
+                lines.append(_header_prefix(name))
+            if type(value) is not bytes_type:
+                value = utf8(value)
+            lines.append(value)
         for cookie_dict in getattr(self, "_new_cookies", []):
             for cookie in cookie_dict.values():
-                lines.append(utf8("Set-Cookie: " + cookie.OutputString(None)))
-        return b("\r\n").join(lines) + b("\r\n\r\n")
+                lines.append(_HEADER_PREFIXES["Set-Cookie"])
+                lines.append(utf8(cookie.OutputString(None)))
+        lines.append(b("\r\n\r\n"))
+        return b("").join(lines)
 
     def _log(self):
         """Logs the current request.
@@ -1100,6 +1413,52 @@ def addslash(method):
     return wrapper
 
 
+def cached(ttl=60, vary=(), max_size=16 * 1024 * 1024):
+    """Use this decorator to cache the responses of a GET method.
+
+    Responses are cached by host, path and query string, and by the
+    values of the request headers named in ``vary``.  HEAD requests are
+    answered from the entries of GET requests, but do not add any.  What is
+    stored is the final output, after transforms such as
+    `GZipContentEncoding`, so clients that accept gzip get their own
+    entries.  Entries expire after ``ttl`` seconds, and the least recently
+    used are dropped when the cache holds more than ``max_size`` bytes.
+    Only complete 200 responses that were not flushed early and do not
+    set cookies are cached::
+
+        class FrontPageHandler(RequestHandler):
+            @cached(ttl=30, vary=("Accept-Language",))
+            def get(self):
+                self.render("front.html", entries=self.db.query(...))
+
+    Cached responses answer ``If-None-Match`` with 304 if they have an
+    etag.  The cache is available as the ``cache`` attribute of the
+    decorated method, with ``hits`` and ``misses`` counters, e.g.
+    ``FrontPageHandler.get.cache.hits``.  Caches are per process.
+    """
+    def decorator(method):
+        cache = _ResponseCache(ttl, max_size)
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            request = self.request
+            if (self.application._wsgi or
+                request.method not in ("GET", "HEAD")):
+                return method(self, *args, **kwargs)
+            key = (request.version, request.host, request.uri,
+                   "gzip" in request.headers.get("Accept-Encoding", ""),
+                   tuple([request.headers.get(name) for name in vary]))
+            response = cache.get(key)
+            if response is not None:
+                self._finish_cached(response)
+                return
+            if request.method == "GET":
+                self._response_cache = (cache, key)
+            return method(self, *args, **kwargs)
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
 class Application(object):
     """A collection of request handlers that make up a web application.
 
@@ -1139,11 +1498,37 @@ class Application(object):
     (this is configurable with the static_url_prefix setting),
     and we will serve /favicon.ico and /robots.txt from the same directory.
 
+    The signatures that `RequestHandler.static_url` adds to static URLs
+    can be computed in advance with the static_manifest setting.  If it
+    is True, all files under static_path are hashed when the Application
+    is created (so this is done only once if the process forks later).
+    Otherwise it is the name of a JSON file written by a deployment step
+    from `StaticFileHandler.build_manifest`, e.g.::
+
+        python -c "from tornado.web import StaticFileHandler; from tornado.escape import json_encode; print json_encode(StaticFileHandler.build_manifest('static'))" > static-manifest.json
+
+    With the phase_stats setting, the time taken by each phase of
+    every request (see `RequestHandler.phase_times`) is collected into
+    histograms for each route, in the `phase_stats` attribute.  With the
+    log_phases setting, the phases are also written to the request log.
+
+    The request log is written by `log_request`.  With the access_log
+    setting, which is True or an `AccessLog`, it is written in batches by
+    a background thread.
+
     .. attribute:: settings
 
        Additonal keyword arguments passed to the constructor are saved in the
        `settings` dictionary, and are often referred to in documentation as
        "application settings".
+
+    .. attribute:: phase_stats
+
+       A `PhaseStats` if the phase_stats setting is True, otherwise None.
+
+    .. attribute:: access_log
+
+       The `AccessLog` given by the access_log setting, or None.
     """
     def __init__(self, handlers=None, default_host="", transforms=None,
                  wsgi=False, **settings):
@@ -1155,6 +1540,9 @@ class Application(object):
         else:
             self.transforms = transforms
         self.handlers = []
+        self._routers = {}  # id(host handler list) -> _URLRouter
+        self._host_cache = {}  # Host header -> host handler list or None
+        self._exact_hosts = {}  # literal hostname -> host handler list
         self.named_handlers = {}
         self.default_host = default_host
         self.settings = settings
@@ -1164,6 +1552,14 @@ class Application(object):
                            }
         self.ui_methods = {}
         self._wsgi = wsgi
+        if settings.get("phase_stats"):
+            self.phase_stats = PhaseStats()
+        else:
+            self.phase_stats = None
+        if settings.get("access_log") is True:
+            self.access_log = AccessLog()
+        else:
+            self.access_log = settings.get("access_log")
         self._load_ui_modules(settings.get("ui_modules", {}))
         self._load_ui_methods(settings.get("ui_methods", {}))
         if self.settings.get("static_path"):
@@ -1171,6 +1567,10 @@ class Application(object):
             handlers = list(handlers or [])
             static_url_prefix = settings.get("static_url_prefix",
                                              "/static/")
+            if settings.get("static_precompress"):
+                StaticFileHandler.precompress(path)
+            if settings.get("static_manifest"):
+                self._load_static_manifest(path, settings["static_manifest"])
             handlers = [
                 (re.escape(static_url_prefix) + r"(.*)", StaticFileHandler,
                  dict(path=path)),
@@ -1184,6 +1584,21 @@ class Application(object):
             import autoreload
             autoreload.start()
 
+    def _load_static_manifest(self, static_path, manifest):
+        if manifest is True:
+            manifest = StaticFileHandler.build_manifest(static_path)
+        else:
+            f = open(manifest, "rb")
+            try:
+                manifest = escape.json_decode(f.read())
+            finally:
+                f.close()
+        for path, signature in manifest.iteritems():
+            if os.path.sep != "/":
+                path = path.replace("/", os.path.sep)
+            RequestHandler._static_hashes[
+                os.path.join(static_path, path)] = signature
+
     def listen(self, port, address="", **kwargs):
         """Starts an HTTP server for this application on the given port.
 
@@ -1210,6 +1625,10 @@ class Application(object):
         order they were added, and only the first matching pattern is
         used.  This means that all handlers for a given host must be
         added in a single add_handlers call.
+
+        The host a request is routed to is cached by its Host header, so
+        handler groups must be added with this method rather than by
+        modifying `handlers` directly.
         """
         if not host_pattern.endswith("$"):
             host_pattern += "$"
@@ -1247,23 +1666,62 @@ class Application(object):
                         "Multiple handlers named %s; replacing previous value",
                         spec.name)
                 self.named_handlers[spec.name] = spec
+        self._reset_host_lookup()
 
     def add_transform(self, transform_class):
         """Adds the given OutputTransform to our transform list."""
         self.transforms.append(transform_class)
 
+    # Maximum number of Host headers whose handler group is remembered.
+    # The Host header is chosen by the client, so the cache is simply
+    # emptied when it fills up.
+    _HOST_CACHE_SIZE = 1000
+
     def _get_host_handlers(self, request):
-        host = request.host.lower().split(':')[0]
+        handlers = self._lookup_host(request.host)
+        if handlers is not None:
+            return handlers
+        # Look for default host if not behind load balancer (for debugging)
+        if "X-Real-Ip" not in request.headers:
+            return self._lookup_host(self.default_host)
+        return None
+
+    def _lookup_host(self, host_header):
+        try:
+            return self._host_cache[host_header]
+        except KeyError:
+            pass
+        host = host_header.lower().split(':')[0]
+        if host in self._exact_hosts:
+            handlers = self._exact_hosts[host]
+        else:
+            handlers = self._match_host(host)
+        if len(self._host_cache) >= self._HOST_CACHE_SIZE:
+            self._host_cache.clear()
+        self._host_cache[host_header] = handlers
+        return handlers
+
+    def _match_host(self, host):
         for pattern, handlers in self.handlers:
             if pattern.match(host):
                 return handlers
-        # Look for default host if not behind load balancer (for debugging)
-        if "X-Real-Ip" not in request.headers:
-            for pattern, handlers in self.handlers:
-                if pattern.match(self.default_host):
-                    return handlers
         return None
 
+    def _reset_host_lookup(self):
+        self._host_cache = {}
+        self._exact_hosts = {}
+        for pattern, handlers in self.handlers:
+            host, exact = _literal_prefix(pattern)
+            if exact and host not in self._exact_hosts:
+                # An earlier pattern may also match this hostname
+                self._exact_hosts[host] = self._match_host(host)
+
+    def _get_router(self, handlers):
+        router = self._routers.get(id(handlers))
+        if router is None or router.specs is not handlers:
+            router = self._routers[id(handlers)] = _URLRouter(handlers)
+        return router
+
     def _load_ui_methods(self, methods):
         if type(methods) is types.ModuleType:
             self._load_ui_methods(dict((n, getattr(methods, n))
@@ -1293,7 +1751,6 @@ class Application(object):
 
     def __call__(self, request):
         """Called by HTTPServer to execute the request."""
-        transforms = [t(request) for t in self.transforms]
         handler = None
         args = []
         kwargs = {}
@@ -1302,29 +1759,28 @@ class Application(object):
             handler = RedirectHandler(
                 self, request, url="http://" + self.default_host + "/")
         else:
-            for spec in handlers:
-                match = spec.regex.match(request.path)
-                if match:
-                    handler = spec.handler_class(self, request, **spec.kwargs)
-                    if spec.regex.groups:
-                        # None-safe wrapper around url_unescape to handle
-                        # unmatched optional groups correctly
-                        def unquote(s):
-                            if s is None: return s
-                            return escape.url_unescape(s, encoding=None)
-                        # Pass matched groups to the handler.  Since
-                        # match.groups() includes both named and unnamed groups,
-                        # we want to use either groups or groupdict but not both.
-                        # Note that args are passed as bytes so the handler can
-                        # decide what encoding to use.
-
-                        if spec.regex.groupindex:
-                            kwargs = dict(
-                                (k, unquote(v))
-                                for (k, v) in match.groupdict().iteritems())
-                        else:
-                            args = [unquote(s) for s in match.groups()]
-                    break
+            spec, match = self._get_router(handlers).find(request.path)
+            if spec is not None:
+                handler = spec.handler_class(self, request, **spec.kwargs)
+                handler._route = spec.name or spec.regex.pattern
+                if spec.regex.groups:
+                    # None-safe wrapper around url_unescape to handle
+                    # unmatched optional groups correctly
+                    def unquote(s):
+                        if s is None: return s
+                        return escape.url_unescape(s, encoding=None)
+                    # Pass matched groups to the handler.  Since
+                    # match.groups() includes both named and unnamed groups,
+                    # we want to use either groups or groupdict but not both.
+                    # Note that args are passed as bytes so the handler can
+                    # decide what encoding to use.
+
+                    if spec.regex.groupindex:
+                        kwargs = dict(
+                            (k, unquote(v))
+                            for (k, v) in match.groupdict().iteritems())
+                    else:
+                        args = [unquote(s) for s in match.groups()]
             if not handler:
                 handler = ErrorHandler(self, request, status_code=404)
 
@@ -1334,9 +1790,9 @@ class Application(object):
             if getattr(RequestHandler, "_templates", None):
                 for loader in RequestHandler._templates.values():
                     loader.reset()
-            RequestHandler._static_hashes = {}
+            StaticFileHandler._file_cache.clear()
 
-        handler._execute(transforms, *args, **kwargs)
+        handler._execute(self.transforms, *args, **kwargs)
         return handler
 
     def reverse_url(self, name, *args):
@@ -1359,15 +1815,188 @@ class Application(object):
         if "log_function" in self.settings:
             self.settings["log_function"](handler)
             return
-        if handler.get_status() < 400:
-            log_method = logging.info
-        elif handler.get_status() < 500:
-            log_method = logging.warning
+        if self.settings.get("log_phases"):
+            phase_times = handler.phase_times
         else:
-            log_method = logging.error
-        request_time = 1000.0 * handler.request.request_time()
-        log_method("%d %s %.2fms", handler.get_status(),
-                   handler._request_summary(), request_time)
+            phase_times = None
+        if self.access_log is not None:
+            self.access_log.log(handler, phase_times)
+            return
+        level, msg, args = _request_log_entry(
+            handler.get_status(), handler._request_summary(),
+            1000.0 * handler.request.request_time(), phase_times)
+        logging.log(level, msg, *args)
+
+
+def _request_log_entry(status, summary, request_time, phase_times=None):
+    """Returns the level, message and arguments to log a request with."""
+    if status < 400:
+        level = logging.INFO
+    elif status < 500:
+        level = logging.WARNING
+    else:
+        level = logging.ERROR
+    if phase_times is None:
+        return level, "%d %s %.2fms", (status, summary, request_time)
+    start = phase_times["headers"]
+    phases = " ".join(["%s=%.2f" % (phase,
+                                    1000.0 * (phase_times[phase] - start))
+                       for phase in RequestHandler.PHASES[1:]
+                       if phase in phase_times])
+    return level, "%d %s %.2fms (%s)", (status, summary, request_time, phases)
+
+
+class AccessLog(object):
+    """Writes the request log from a background thread.
+
+    Logging every request on the IOLoop thread adds the cost of the log
+    handlers (and of disks or syslog servers that may block) to every
+    request.  Given as the access_log setting of an `Application`, an
+    AccessLog instead only adds a tuple to a queue for each request.  A
+    background thread takes all queued entries every ``flush_interval``
+    seconds, or as soon as ``max_queue_size`` entries are waiting, and
+    formats and logs them to ``logger`` (the root logger by default).
+    Log records keep the time at which the request finished.
+
+    When the queue is full, entries are dropped; they are counted in
+    ``dropped``, and ``written`` counts the entries that were logged.
+    Anything still queued is written when the process exits, or when
+    `close` is called.
+    """
+    def __init__(self, logger=None, max_queue_size=10000, flush_interval=1.0):
+        self.logger = logger or logging.getLogger()
+        self.max_queue_size = max_queue_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self._queue = collections.deque()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._flush_lock = threading.Lock()
+
+    def log(self, handler, phase_times=None):
+        """Queues the log entry for a finished request."""
+        if self._thread is None:
+            self._start()
+        if len(self._queue) >= self.max_queue_size:
+            self.dropped += 1
+            self._wakeup.set()
+            return
+        # deque.append is atomic, so no lock is needed
+        self._queue.append((time.time(), handler.get_status(),
+                            handler._request_summary(),
+                            1000.0 * handler.request.request_time(),
+                            phase_times))
+        if self._closed:
+            self.flush()
+        elif len(self._queue) >= self.max_queue_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Writes all queued entries now."""
+        self._flush_lock.acquire()
+        try:
+            while self._queue:
+                created, status, summary, request_time, phase_times = \
+                    self._queue.popleft()
+                level, msg, args = _request_log_entry(
+                    status, summary, request_time, phase_times)
+                if not self.logger.isEnabledFor(level):
+                    continue
+                record = self.logger.makeRecord(
+                    self.logger.name, level, __file__, 0, msg, args, None)
+                record.created = created
+                record.msecs = (created - int(created)) * 1000
+                self.logger.handle(record)
+                self.written += 1
+        finally:
+            self._flush_lock.release()
+
+    def close(self):
+        """Stops the background thread and writes the remaining entries."""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name="tornado access log")
+        self._thread.setDaemon(True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Don't log through the logger that failed
+                traceback.print_exc()
+
+
+class PhaseStats(object):
+    """Histograms of the time taken by each phase of requests, by route.
+
+    For each route and each of `RequestHandler.PHASES`, this counts
+    how many milliseconds after the request headers were parsed that
+    phase was reached, in buckets bounded by `BUCKETS`.  Routes are
+    named by the name of their `URLSpec`, or else by its pattern.
+
+    An application created with the phase_stats setting has one in its
+    ``phase_stats`` attribute, which can be published from a handler::
+
+        class StatsHandler(tornado.web.RequestHandler):
+            def get(self):
+                self.write(self.application.phase_stats.get_stats())
+    """
+    # Upper bounds of the buckets, in milliseconds; the last bucket
+    # holds everything slower
+    BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+    def __init__(self):
+        self._routes = {}  # route -> phase -> [count, total, bucket counts]
+
+    def add(self, route, phase_times):
+        """Adds the `RequestHandler.phase_times` of a finished request."""
+        phases = self._routes.get(route)
+        if phases is None:
+            phases = self._routes[route] = {}
+        start = phase_times["headers"]
+        for phase, timestamp in phase_times.iteritems():
+            if phase == "headers":
+                continue
+            stats = phases.get(phase)
+            if stats is None:
+                stats = phases[phase] = [0, 0.0, [0] * (len(self.BUCKETS) + 1)]
+            elapsed = 1000.0 * (timestamp - start)
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2][bisect.bisect_left(self.BUCKETS, elapsed)] += 1
+
+    def get_stats(self):
+        """Returns the histograms as a dictionary that can be sent as JSON.
+
+        The result maps each route to a dictionary from phase name to
+        ``{"count": ..., "mean_ms": ..., "buckets": [[bound, count], ...]}``,
+        in which the bound of the last bucket is None.
+        """
+        bounds = list(self.BUCKETS) + [None]
+        result = {}
+        for route, phases in self._routes.iteritems():
+            result[route] = dict(
+                (phase, {"count": count, "mean_ms": total / count,
+                         "buckets": map(list, zip(bounds, buckets))})
+                for phase, (count, total, buckets) in phases.iteritems())
+        return result
+
+    def reset(self):
+        """Discards everything collected so far."""
+        self._routes = {}
 
 
 
@@ -1413,6 +2042,173 @@ class RedirectHandler(RequestHandler):
         self.redirect(self._url, permanent=self._permanent)
 
 
+def _read_file(path):
+    f = open(path, "rb")
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+
+def _hash_file(path):
+    hasher = hashlib.md5()
+    f = open(path, "rb")
+    try:
+        while True:
+            block = f.read(65536)
+            if not block:
+                break
+            hasher.update(block)
+    finally:
+        f.close()
+    return hasher.hexdigest()
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path)[stat.ST_MTIME]
+    except OSError:
+        return None
+
+
+class _StaticFile(object):
+    """What StaticFileHandler knows about a file it serves.
+
+    The contents are only filled in by `read`, for files that are small
+    enough to be cached.  Until then the etags are derived from the
+    modification time and size instead of the contents.
+    """
+    def __init__(self, abspath):
+        stat_result = os.stat(abspath)
+        self.abspath = abspath
+        self.mtime = stat_result[stat.ST_MTIME]
+        self.size = stat_result[stat.ST_SIZE]
+        self.modified = datetime.datetime.fromtimestamp(self.mtime)
+        self.mime_type = mimetypes.guess_type(abspath)[0]
+        self.content = None
+        self.etag = '"%x-%x"' % (self.mtime, self.size)
+        # A precompressed sibling is only used if it is up to date
+        self.gzip_path = self.gzip_content = self.gzip_etag = None
+        try:
+            gzip_stat = os.stat(abspath + ".gz")
+        except OSError:
+            self.gzip_mtime = None
+        else:
+            self.gzip_mtime = gzip_stat[stat.ST_MTIME]
+            if self.gzip_mtime >= self.mtime:
+                self.gzip_path = abspath + ".gz"
+                self.gzip_size = gzip_stat[stat.ST_SIZE]
+                self.gzip_etag = '"%x-%x"' % (self.gzip_mtime, self.gzip_size)
+        self.checked = time.time()
+
+    def read(self):
+        self.content = _read_file(self.abspath)
+        self.etag = '"%s"' % hashlib.sha1(self.content).hexdigest()
+        if self.gzip_path is not None:
+            self.gzip_content = _read_file(self.gzip_path)
+            self.gzip_etag = '"%s"' % hashlib.sha1(
+                self.gzip_content).hexdigest()
+
+    def cache_size(self):
+        return len(self.content or "") + len(self.gzip_content or "")
+
+    def is_current(self):
+        """Returns False if the file or its ``.gz`` sibling has changed."""
+        try:
+            stat_result = os.stat(self.abspath)
+        except OSError:
+            return False
+        return (stat_result[stat.ST_MTIME] == self.mtime and
+                stat_result[stat.ST_SIZE] == self.size and
+                _get_mtime(self.abspath + ".gz") == self.gzip_mtime)
+
+
+def _parse_range_header(range_header):
+    """Parses a ``Range`` header with a single byte range.
+
+    Returns a tuple ``(start, end)`` with an exclusive end, in which
+    ``end`` is None for an open-ended range and ``start`` is None for a
+    suffix range of the last ``end`` bytes.  Returns None for headers
+    that are invalid or ask for several ranges; these are served as if
+    there were no ``Range`` header.
+    """
+    unit, _, value = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in value:
+        return None
+    start, sep, end = value.partition("-")
+    try:
+        start = start.strip()
+        end = end.strip()
+        if not sep or not (start or end):
+            return None
+        if not start:
+            return (None, int(end))
+        start = int(start)
+        if not end:
+            return (start, None)
+        end = int(end) + 1
+    except ValueError:
+        return None
+    if end <= start:
+        return None
+    return (start, end)
+
+
+class _LRUCache(object):
+    """A map with least recently used eviction.
+
+    The size of the cache is the sum of the ``cache_size()`` of its
+    values (`_StaticFile` and `_CachedResponse` objects).  Entries are
+    kept in a circular doubly linked list of ``[prev, next, key, value]``
+    links, most recently used last.
+    """
+    def __init__(self):
+        self.size = 0
+        self._links = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+
+    def get(self, key):
+        link = self._links.get(key)
+        if link is None:
+            return None
+        prev, next = link[0], link[1]
+        prev[1] = next
+        next[0] = prev
+        self._append(link)
+        return link[3]
+
+    def put(self, key, value, max_size):
+        self.remove(key)
+        size = value.cache_size()
+        if size > max_size:
+            return
+        link = [None, None, key, value]
+        self._append(link)
+        self._links[key] = link
+        self.size += size
+        while self.size > max_size:
+            self.remove(self._root[1][2])
+
+    def remove(self, key):
+        link = self._links.pop(key, None)
+        if link is not None:
+            prev, next = link[0], link[1]
+            prev[1] = next
+            next[0] = prev
+            self.size -= link[3].cache_size()
+
+    def clear(self):
+        self.__init__()
+
+    def _append(self, link):
+        root = self._root
+        last = root[0]
+        link[0] = last
+        link[1] = root
+        last[1] = root[0] = link
+
+
 class StaticFileHandler(RequestHandler):
     """A simple handler that can serve static content from a directory.
 
@@ -1430,7 +2226,34 @@ class StaticFileHandler(RequestHandler):
     with the path, we set an infinite HTTP expiration header. So, if you
     want browsers to cache a file indefinitely, send them to, e.g.,
     /static/images/myimage.png?v=xxx.
+
+    If the client accepts gzip and there is a file with the same name plus
+    ``.gz`` that is at least as new as the requested file, that file is
+    sent instead with ``Content-Encoding: gzip``.  These files can be
+    created with `precompress`, which the `Application` calls on its
+    static_path at startup if the ``static_precompress`` setting is true.
+
+    Single byte ranges requested with the ``Range`` header are sent as
+    206 Partial Content responses.  Files that are not cached are sent in
+    pieces of ``STREAM_CHUNK_SIZE`` bytes, each read only after the
+    previous one has been written to the socket.
+
+    Files of up to ``CACHE_MAX_FILE_SIZE`` bytes are kept in memory, in a
+    cache shared by all StaticFileHandlers in the process.  Cached files
+    are served without touching the file system; they are checked for
+    changes at most once every ``CACHE_CHECK_INTERVAL`` seconds.  When the
+    cache holds more than ``CACHE_MAX_BYTES`` bytes, the least recently
+    used files are dropped.  Subclasses may override these class
+    attributes; setting ``CACHE_MAX_BYTES`` to 0 disables the cache.
     """
+    CACHE_MAX_BYTES = 16 * 1024 * 1024
+    CACHE_MAX_FILE_SIZE = 256 * 1024
+    CACHE_CHECK_INTERVAL = 2
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    _file_cache = _LRUCache()
+    _file = None  # the file being streamed, if any
+
     def initialize(self, path, default_filename=None):
         self.root = os.path.abspath(path) + os.path.sep
         self.default_filename = default_filename
@@ -1446,22 +2269,23 @@ class StaticFileHandler(RequestHandler):
         # it needs to be temporarily added back for requests to root/
         if not (abspath + os.path.sep).startswith(self.root):
             raise HTTPError(403, "%s is not in root static directory", path)
-        if os.path.isdir(abspath) and self.default_filename is not None:
-            # need to look at the request.path here for when path is empty
-            # but there is some prefix to the path that was already
-            # trimmed by the routing
-            if not self.request.path.endswith("/"):
-                self.redirect(self.request.path + "/")
-                return
-            abspath = os.path.join(abspath, self.default_filename)
-        if not os.path.exists(abspath):
-            raise HTTPError(404)
-        if not os.path.isfile(abspath):
-            raise HTTPError(403, "%s is not a file", path)
-
-        stat_result = os.stat(abspath)
-        modified = datetime.datetime.fromtimestamp(stat_result[stat.ST_MTIME])
+        static_file = self._get_cached_file(abspath)
+        if static_file is None:
+            if os.path.isdir(abspath) and self.default_filename is not None:
+                # need to look at the request.path here for when path is
+                # empty but there is some prefix to the path that was
+                # already trimmed by the routing
+                if not self.request.path.endswith("/"):
+                    self.redirect(self.request.path + "/")
+                    return
+                abspath = os.path.join(abspath, self.default_filename)
+            if not os.path.exists(abspath):
+                raise HTTPError(404)
+            if not os.path.isfile(abspath):
+                raise HTTPError(403, "%s is not a file", path)
+            static_file = self._load_file(abspath)
 
+        modified = static_file.modified
         self.set_header("Last-Modified", modified)
         if "v" in self.request.arguments:
             self.set_header("Expires", datetime.datetime.utcnow() + \
@@ -1469,34 +2293,219 @@ class StaticFileHandler(RequestHandler):
             self.set_header("Cache-Control", "max-age=" + str(86400*365*10))
         else:
             self.set_header("Cache-Control", "public")
-        mime_type, encoding = mimetypes.guess_type(abspath)
-        if mime_type:
-            self.set_header("Content-Type", mime_type)
+        if static_file.mime_type:
+            self.set_header("Content-Type", static_file.mime_type)
+        gzipped = False
+        if static_file.gzip_path is not None:
+            self.set_header("Vary", "Accept-Encoding")
+            if "gzip" in self.request.headers.get("Accept-Encoding", ""):
+                self.set_header("Content-Encoding", "gzip")
+                gzipped = True
 
         self.set_extra_headers(path)
 
-        # Check the If-Modified-Since, and don't send the result if the
-        # content has not been modified
+        if gzipped:
+            abspath = static_file.gzip_path
+            content, etag = static_file.gzip_content, static_file.gzip_etag
+            size = static_file.gzip_size
+        else:
+            content, etag = static_file.content, static_file.etag
+            size = static_file.size
+        self.set_header("Etag", etag)
+        self.set_header("Accept-Ranges", "bytes")
+
+        # Check the If-None-Match or, failing that, the If-Modified-Since
+        # header, and don't send the result if the content has not been
+        # modified.  finish() only checks If-None-Match when it computes
+        # the etag itself.
+        inm_value = self.request.headers.get("If-None-Match")
         ims_value = self.request.headers.get("If-Modified-Since")
-        if ims_value is not None:
+        if inm_value is not None:
+            if inm_value.find(etag) != -1 or inm_value.strip() == "*":
+                self.set_status(304)
+                return
+        elif ims_value is not None:
             date_tuple = email.utils.parsedate(ims_value)
             if_since = datetime.datetime.fromtimestamp(time.mktime(date_tuple))
             if if_since >= modified:
                 self.set_status(304)
                 return
 
+        start, end = 0, size
+        range_value = self.request.headers.get("Range")
+        if_range = self.request.headers.get("If-Range")
+        if range_value is not None and (
+            if_range is None or
+            if_range in (etag, self._headers["Last-Modified"])):
+            request_range = _parse_range_header(range_value)
+            if request_range is not None:
+                start, end = request_range
+                if start is None:
+                    # A suffix range: the last "end" bytes
+                    start = max(size - end, 0)
+                    end = size
+                elif end is None or end > size:
+                    end = size
+                if start >= end:
+                    self.set_status(416)
+                    self.set_header("Content-Range", "bytes */%d" % size)
+                    return
+                self.set_status(206)
+                self.set_header("Content-Range",
+                                "bytes %d-%d/%d" % (start, end - 1, size))
+
         if not include_body:
             return
-        file = open(abspath, "rb")
-        try:
-            self.write(file.read())
-        finally:
-            file.close()
+        self.set_header("Content-Length", end - start)
+        if content is not None:
+            self.write(content[start:end])
+        elif self.application._wsgi:
+            file = open(abspath, "rb")
+            try:
+                file.seek(start)
+                self.write(file.read(end - start))
+            finally:
+                file.close()
+        else:
+            self._stream_file(abspath, start, end - start)
 
     def set_extra_headers(self, path):
         """For subclass to add extra headers to the response"""
         pass
 
+    def on_connection_close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _stream_file(self, abspath, start, length):
+        # Send large files STREAM_CHUNK_SIZE bytes at a time, reading the
+        # next chunk only when the previous one has been sent.
+        self._auto_finish = False
+        self._file = open(abspath, "rb")
+        self._file.seek(start)
+        self._remaining = length
+        self._stream_next_chunk()
+
+    def _stream_next_chunk(self):
+        if self._file is None:
+            # The connection was closed
+            return
+        chunk = self._file.read(min(self._remaining, self.STREAM_CHUNK_SIZE))
+        self._remaining -= len(chunk)
+        if self._remaining <= 0 or not chunk:
+            self._file.close()
+            self._file = None
+            self.finish(chunk)
+        else:
+            self.write(chunk)
+            self.flush(callback=self._stream_next_chunk)
+
+    def _get_cached_file(self, abspath):
+        static_file = StaticFileHandler._file_cache.get(abspath)
+        if static_file is None:
+            return None
+        now = time.time()
+        if now - static_file.checked >= self.CACHE_CHECK_INTERVAL:
+            if not static_file.is_current():
+                StaticFileHandler._file_cache.remove(abspath)
+                return None
+            static_file.checked = now
+        return static_file
+
+    def _load_file(self, abspath):
+        static_file = _StaticFile(abspath)
+        if (static_file.size <= self.CACHE_MAX_FILE_SIZE and
+            self.CACHE_MAX_BYTES > 0):
+            static_file.read()
+            StaticFileHandler._file_cache.put(abspath, static_file,
+                                              self.CACHE_MAX_BYTES)
+        return static_file
+
+    @classmethod
+    def build_manifest(cls, path, num_threads=4):
+        """Returns the signatures of the files under ``path``.
+
+        The result maps each file's path relative to ``path``, with ``/``
+        separators, to the MD5 hex digest used by `RequestHandler.static_url`.
+        Files are hashed by ``num_threads`` threads, since reading and
+        hashing large files releases the GIL.
+        """
+        queue = Queue.Queue()
+        for dirpath, dirnames, filenames in os.walk(path):
+            for filename in filenames:
+                queue.put(os.path.join(dirpath, filename))
+        manifest = {}
+        prefix_length = len(os.path.join(path, ""))
+        def worker():
+            while True:
+                try:
+                    abspath = queue.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    signature = _hash_file(abspath)
+                except IOError:
+                    # Removed while we were hashing
+                    continue
+                relpath = abspath[prefix_length:]
+                manifest[relpath.replace(os.path.sep, "/")] = signature
+        threads = [threading.Thread(target=worker)
+                   for i in xrange(num_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return manifest
+
+    @classmethod
+    def precompress(cls, path, level=9):
+        """Writes a gzipped ``.gz`` copy of the files under ``path``.
+
+        Only files with one of `GZipContentEncoding.CONTENT_TYPES` that are
+        at least `GZipContentEncoding.MIN_LENGTH` bytes long are compressed,
+        and copies that are already up to date or would not be smaller
+        are skipped.  This may be called at startup or from a deployment
+        script, e.g.::
+
+            python -c "from tornado.web import StaticFileHandler; StaticFileHandler.precompress('static')"
+        """
+        for dirpath, dirnames, filenames in os.walk(path):
+            for filename in filenames:
+                abspath = os.path.join(dirpath, filename)
+                mime_type, encoding = mimetypes.guess_type(abspath)
+                if (encoding is not None or mime_type not in
+                    GZipContentEncoding.CONTENT_TYPES):
+                    continue
+                stat_result = os.stat(abspath)
+                if (stat_result[stat.ST_SIZE] <
+                    GZipContentEncoding.MIN_LENGTH):
+                    continue
+                gzip_path = abspath + ".gz"
+                if (os.path.exists(gzip_path) and
+                    os.stat(gzip_path)[stat.ST_MTIME] >=
+                    stat_result[stat.ST_MTIME]):
+                    continue
+                f = open(abspath, "rb")
+                try:
+                    data = f.read()
+                finally:
+                    f.close()
+                compressor = zlib.compressobj(level, zlib.DEFLATED,
+                                              16 + zlib.MAX_WBITS)
+                data = compressor.compress(data) + compressor.flush()
+                if len(data) >= stat_result[stat.ST_SIZE]:
+                    continue
+                # Write to a temporary file and rename it so a server
+                # never sees a partially written file.
+                tmp_path = gzip_path + ".tmp"
+                f = open(tmp_path, "wb")
+                try:
+                    f.write(data)
+                finally:
+                    f.close()
+                os.rename(tmp_path, gzip_path)
+
 
 class FallbackHandler(RequestHandler):
     """A RequestHandler that wraps another HTTP server callback.
@@ -1542,12 +2551,21 @@ class GZipContentEncoding(OutputTransform):
     """Applies the gzip content encoding to the response.
 
     See http://www.w3.org/Protocols/rfc2616/rfc2616-sec14.html#sec14.11
+
+    The compression level, the minimum length of a response worth
+    compressing and the content types to compress are class attributes.
+    To change them, subclass this transform and pass the subclass in the
+    ``transforms`` argument to `Application` (or to `Application.add_transform`
+    with the ``gzip`` setting turned off).  Responses that are flushed in
+    several pieces are always compressed, since their length is not known
+    when the headers are written.
     """
     CONTENT_TYPES = set([
         "text/plain", "text/html", "text/css", "text/xml",
         "application/x-javascript", "application/xml", "application/atom+xml",
         "text/javascript", "application/json", "application/xhtml+xml"])
-    MIN_LENGTH = 5
+    MIN_LENGTH = 1024
+    GZIP_LEVEL = 6
 
     def __init__(self, request):
         self._gzipping = request.supports_http_1_1() and \
@@ -1559,11 +2577,14 @@ class GZipContentEncoding(OutputTransform):
             self._gzipping = (ctype in self.CONTENT_TYPES) and \
                 (not finishing or len(chunk) >= self.MIN_LENGTH) and \
                 (finishing or "Content-Length" not in headers) and \
-                ("Content-Encoding" not in headers)
+                ("Content-Encoding" not in headers) and \
+                ("Content-Range" not in headers)
         if self._gzipping:
             headers["Content-Encoding"] = "gzip"
-            self._gzip_value = BytesIO()
-            self._gzip_file = gzip.GzipFile(mode="w", fileobj=self._gzip_value)
+            # A wbits value of 16 + MAX_WBITS makes zlib write the gzip
+            # header and trailer itself.
+            self._compressor = zlib.compressobj(
+                self.GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
             chunk = self.transform_chunk(chunk, finishing)
             if "Content-Length" in headers:
                 headers["Content-Length"] = str(len(chunk))
@@ -1571,14 +2592,12 @@ class GZipContentEncoding(OutputTransform):
 
     def transform_chunk(self, chunk, finishing):
         if self._gzipping:
-            self._gzip_file.write(chunk)
+            chunk = self._compressor.compress(chunk)
             if finishing:
-                self._gzip_file.close()
+                chunk += self._compressor.flush()
+                self._compressor = None
             else:
-                self._gzip_file.flush()
-            chunk = self._gzip_value.getvalue()
-            self._gzip_value.truncate(0)
-            self._gzip_value.seek(0)
+                chunk += self._compressor.flush(zlib.Z_SYNC_FLUSH)
         return chunk
 
 
@@ -1825,17 +2844,220 @@ class URLSpec(object):
 url = URLSpec
 
 
-def _time_independent_equals(a, b):
-    if len(a) != len(b):
-        return False
-    result = 0
-    if type(a[0]) is int:  # python3 byte strings
-        for x, y in zip(a,b):
-            result |= x ^ y
-    else:  # python2
-        for x, y in zip(a, b):
-            result |= ord(x) ^ ord(y)
-    return result == 0
+class _URLRouter(object):
+    """Finds the first `URLSpec` in a list that matches a request path.
+
+    The result is the same as trying each spec's regex in order, but
+    specs whose patterns are plain strings are found with a dictionary
+    lookup, and the remaining specs are filed in a trie under the
+    complete path segments their patterns start with (e.g.
+    ``/static/(.*)`` under ``["", "static"]``).  Only the regexes of
+    specs on the path through the trie are tried, in their original order.
+
+    The trie is rebuilt if specs are added to the list.
+    """
+    def __init__(self, specs):
+        self.specs = specs
+        self._compiled_len = None
+
+    def _compile(self):
+        self._exact = {}
+        self._root = ({}, [])  # (children by path segment, spec indices)
+        for index, spec in enumerate(self.specs):
+            prefix, exact = _literal_prefix(spec.regex)
+            if exact:
+                self._exact.setdefault(prefix, index)
+                continue
+            node = self._root
+            for segment in prefix.split("/")[:-1]:
+                node = node[0].setdefault(segment, ({}, []))
+            node[1].append(index)
+        self._compiled_len = len(self.specs)
+
+    def find(self, path):
+        """Returns ``(spec, match)`` for the first spec matching ``path``.
+
+        ``match`` is None when the spec's pattern has no regex syntax.
+        Returns ``(None, None)`` if no spec matches.
+        """
+        if self._compiled_len != len(self.specs):
+            self._compile()
+        exact = self._exact.get(path)
+        node = self._root
+        candidates = list(node[1])
+        for segment in path.split("/"):
+            node = node[0].get(segment)
+            if node is None:
+                break
+            candidates.extend(node[1])
+        candidates.sort()
+        for index in candidates:
+            if exact is not None and index > exact:
+                break
+            spec = self.specs[index]
+            match = spec.regex.match(path)
+            if match:
+                return spec, match
+        if exact is not None:
+            return self.specs[exact], None
+        return None, None
+
+
+_REGEX_SPECIAL = frozenset(".^$*+?{}[]\\|()")
+_REGEX_QUANTIFIERS = frozenset("*+?{")
+
+def _literal_prefix(regex):
+    """Returns ``(prefix, exact)`` for a compiled url regex.
+
+    ``prefix`` is the literal text every match must start with, and
+    ``exact`` is True if the pattern matches nothing but that text.
+    """
+    pattern = regex.pattern
+    if regex.flags & (re.IGNORECASE | re.VERBOSE) or "|" in pattern:
+        return "", False
+    if pattern.startswith("^"):
+        pattern = pattern[1:]
+    prefix = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            # Escaped punctuation is literal; \d, \w etc. are not.
+            if i + 1 == len(pattern) or pattern[i + 1].isalnum():
+                break
+            i += 1
+            c = pattern[i]
+        elif c in _REGEX_SPECIAL:
+            if c == "$" and i == len(pattern) - 1:
+                return "".join(prefix), True
+            break
+        if i + 1 < len(pattern) and pattern[i + 1] in _REGEX_QUANTIFIERS:
+            # A quantified character is not part of the prefix
+            break
+        prefix.append(c)
+        i += 1
+    return "".join(prefix), False
+
+
+if hasattr(hmac, "compare_digest"):  # python 2.7.7+ and 3.3+
+    _time_independent_equals = hmac.compare_digest
+else:
+    def _time_independent_equals(a, b):
+        if len(a) != len(b):
+            return False
+        result = 0
+        if type(a[0]) is int:  # python3 byte strings
+            for x, y in zip(a,b):
+                result |= x ^ y
+        else:  # python2
+            for x, y in zip(a, b):
+                result |= ord(x) ^ ord(y)
+        return result == 0
+
+
+def _status_line(version, status_code):
+    return utf8("%s %d %s" % (version, status_code,
+                              httplib.responses[status_code]))
+
+# Status lines for all known status codes, as sent in responses
+_STATUS_LINES = dict(((version, code), _status_line(version, code))
+                     for version in ("HTTP/1.0", "HTTP/1.1")
+                     for code in httplib.responses)
+
+def _header_prefix(name):
+    prefix = utf8("\r\n" + name + ": ")
+    # Bounded in case an application makes up header names
+    if len(_HEADER_PREFIXES) < 1000:
+        _HEADER_PREFIXES[name] = prefix
+    return prefix
+
+# Header names encoded as they begin a line in _generate_headers.  Other
+# names are added when they are first sent.
+_HEADER_PREFIXES = {}
+for _name in ("Server", "Content-Type", "Date", "Content-Length", "Etag",
+              "Connection", "Set-Cookie", "Last-Modified", "Location",
+              "Cache-Control", "Expires", "Vary", "Content-Encoding",
+              "Transfer-Encoding"):
+    _header_prefix(_name)
+del _name
+
+_SERVER_HEADER = utf8("TornadoServer/%s" % tornado.version)
+_DEFAULT_CONTENT_TYPE = b("text/html; charset=UTF-8")
+
+# The second and Date header value last returned by _http_date
+_date_header = [None, None]
+
+def _http_date():
+    """Returns the current time formatted for the Date header.
+
+    The value only changes once a second, so it is formatted at most
+    once a second.  It is refreshed when needed rather than by a timer on
+    the IOLoop, since WSGI applications have no IOLoop; checking the clock
+    is cheap compared to formatting the date.
+    """
+    now = int(time.time())
+    if _date_header[0] != now:
+        _date_header[1] = utf8(email.utils.formatdate(
+                now, localtime=False, usegmt=True))
+        _date_header[0] = now
+    return _date_header[1]
+
+
+class _CRC32(object):
+    """A hashlib-style wrapper around zlib.crc32 for cheap etags."""
+    def __init__(self):
+        self._value = 0
+
+    def update(self, data):
+        self._value = zlib.crc32(data, self._value)
+
+    def hexdigest(self):
+        return "%08x" % (self._value & 0xffffffff)
+
+
+_ETAG_HASHES = {
+    "sha1": hashlib.sha1,
+    "md5": hashlib.md5,
+    "crc32": _CRC32,
+}
+
+
+class _CachedResponse(object):
+    def __init__(self, headers, body, expires):
+        self.headers = headers
+        self.body = body
+        self.expires = expires
+
+    def cache_size(self):
+        return len(self.body)
+
+
+class _ResponseCache(object):
+    """The cache behind a method decorated with `cached`."""
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._responses = _LRUCache()
+
+    def get(self, key):
+        response = self._responses.get(key)
+        if response is not None and response.expires <= time.time():
+            self._responses.remove(key)
+            response = None
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def put(self, key, headers, body):
+        self._responses.put(key, _CachedResponse(
+                dict(headers), body, time.time() + self.ttl), self.max_size)
+
+    def clear(self):
+        self._responses.clear()
 
 
 class _O(dict):